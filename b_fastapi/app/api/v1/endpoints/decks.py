@@ -1,96 +1,205 @@
-from fastapi import APIRouter, UploadFile, File, Form , HTTPException 
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, UploadFile, File, Form , HTTPException, Response, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import TypeAdapter 
+import asyncio
+import json
 # from services.chunking import chunk_text
-from schemas.decks_schema import CreateDeckRequest, TemplateFields, PromptInstructions ,Flashcard, ConfirmDeckRequest, DeckCreationResult , DeckDeleteRequest , DeckDeleteResponse, TopicDeckRequest 
-from services.decks_service import process_deck_creation , build_topic_blueprint , flesh_out_concept , process_deck_creation_topic
-from services.deck_creator import create_deck_from_request, list_deck_metadata , delete_deck_by_id 
-from typing import List
+from schemas.decks_schema import CreateDeckRequest, TemplateFields, PromptInstructions ,Flashcard, ConfirmDeckRequest, DeckCreationResult , DeckDeleteRequest , DeckDeleteResponse, TopicDeckRequest, DeckJobSubmitResponse, DeckJobStatus, DeckBuildStats, AppendDeckRequest, DeckAppendResult, BulkConfirmDeckRequest, BulkConfirmDeckResponse 
+from services.decks_service import process_deck_creation , create_topic_flashcards , stream_deck_creation
+from services.document_cache import open_document, release_document
+from services.jobs_service import submit_pdf_job, submit_topic_job, get_job, get_job_result
+from services.deck_creator import build_deck, build_decks_bulk, append_to_deck, deck_build_stats, list_deck_metadata , delete_deck_by_id 
+from typing import List, Literal, Optional
 
 router = APIRouter()
 schemasRouter = APIRouter()
 
 @router.post("/create/",response_model=List[Flashcard])   
 async def generate_cards(
+    response: Response,
     Create_Deck_Request: str = Form(...),
-    pdf_file: UploadFile = File(...)
+    pdf_file: Optional[UploadFile] = File(None)
 ):
     try:
         data = TypeAdapter(CreateDeckRequest).validate_json(Create_Deck_Request)
     except Exception as e:
         return JSONResponse(status_code=400, content={"error": f"Invalid JSON structure: {str(e)}"})
 
+    try:
+        pdf_path, document_id, temporary = await open_document(pdf_file, data.document_id)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except LookupError as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+
+    skip_report = {}
     try:
         flashcards = await process_deck_creation(
-            pdf_file=pdf_file,
+            pdf_path=pdf_path,
             template=data.template,
-            prompt=data.prompt
+            prompt=data.prompt,
+            concurrency=data.concurrency,
+            chunking=data.chunking,
+            pack_size=data.pack_size,
+            dedup=data.dedup,
+            dedup_threshold=data.dedup_threshold,
+            skip_boilerplate=data.skip_boilerplate,
+            pages=data.pages,
+            document_id=document_id,
+            report=skip_report
     )
+    except ValueError as e:
+        # selección de páginas o modo de chunking inválidos
+        return JSONResponse(status_code=400, content={"error": str(e)})
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": str(e)})
-
+    finally:
+        if temporary:
+            pdf_path.unlink(missing_ok=True)
+        else:
+            release_document(document_id)
+
+    response.headers["X-Document-Id"] = document_id
+    # líneas repetidas y chunks descartados por el filtro previo
+    response.headers["X-Skip-Report"] = json.dumps(skip_report)
     return flashcards
 
+@router.post("/create/stream/")
+async def generate_cards_stream(
+    Create_Deck_Request: str = Form(...),
+    pdf_file: Optional[UploadFile] = File(None)
+):
+    """
+    Igual que /create/ pero responde en NDJSON: un evento por línea con el
+    progreso (chunks completados, fallos) y las tarjetas de cada chunk en cuanto están listas.
+    """
+    try:
+        data = TypeAdapter(CreateDeckRequest).validate_json(Create_Deck_Request)
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": f"Invalid JSON structure: {str(e)}"})
+
+    try:
+        pdf_path, document_id, temporary = await open_document(pdf_file, data.document_id)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except LookupError as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+    async def event_lines():
+        try:
+            async for event in stream_deck_creation(
+                pdf_path, document_id, data.template, data.prompt,
+                concurrency=data.concurrency, chunking=data.chunking, pack_size=data.pack_size,
+                dedup=data.dedup, dedup_threshold=data.dedup_threshold,
+                skip_boilerplate=data.skip_boilerplate, pages=data.pages
+            ):
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        finally:
+            if temporary:
+                pdf_path.unlink(missing_ok=True)
+            else:
+                release_document(document_id)
+
+    return StreamingResponse(event_lines(), media_type="application/x-ndjson")
+
 @router.post("/create-from-topic/", response_model=List[Flashcard]) 
 async def create_deck_from_topic(request: TopicDeckRequest):
     try:
-        blueprint_prompt = PromptInstructions(
-            system_prompt= "Actúa como un experto académico. Tu tarea es generar un esquema maestro con los fundamentos esenciales,  estructuras y temas clave que constituyen el núcleo del tópico proporcionado. Sé riguroso, preciso y exhaustivo.",
-            temperature= 0.3,
-            max_tokens=512
-        )  
-
-        blueprint_text = await build_topic_blueprint(request.topic, blueprint_prompt)
-        # chunks = chunk_text(blueprint_text)
-        chunks = [line.strip() for line in blueprint_text.split('\n') if line.strip()] 
-        if not chunks:
-            raise HTTPException(status_code=400, detail="No se generaron conceptos a partir del tema proporcionado.")
-       
-
-        expanded_concepts = [] 
-
-        flesh_out_prompt= PromptInstructions(
-            system_prompt= "Desarrolla en profundidad el siguiente concepto clave como si estuvieras escribiendo un capítulo académico. Explícalo con claridad, detalle y precisión, de forma estructurada y comprensible para estudiantes avanzados.",
-            temperature= 0.4,
-            max_tokens= 512 
-        )
-
-        for idx, chunk in enumerate(chunks):
-            try:
-                concept_expansion = await flesh_out_concept(chunk, flesh_out_prompt)
-                expanded_concepts.append(concept_expansion.strip())
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Error al expandir el concepto {idx+1}: {str(e)}")
-
-        if not expanded_concepts:
-            raise HTTPException(status_code=400, detail="No se generaron conceptos expandidos a partir del tema proporcionado.")
-        
-        try:
-             flashcards = await process_deck_creation_topic(
-                chunks=expanded_concepts,
-                template=request.template,
-                prompt=request.prompt)
+        return await create_topic_flashcards(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error al procesar la creación del mazo: {str(e)}")
 
-        return flashcards
 
+@router.post("/jobs/create/", response_model=DeckJobSubmitResponse, status_code=202)
+async def submit_generate_cards_job(
+    Create_Deck_Request: str = Form(...),
+    pdf_file: Optional[UploadFile] = File(None)
+):
+    try:
+        data = TypeAdapter(CreateDeckRequest).validate_json(Create_Deck_Request)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-   
+        return JSONResponse(status_code=400, content={"error": f"Invalid JSON structure: {str(e)}"})
 
+    try:
+        job_id, document_id = await submit_pdf_job(data, pdf_file)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except LookupError as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+    return {"job_id": job_id, "status": "queued", "document_id": document_id}
+
+@router.post("/jobs/create-from-topic/", response_model=DeckJobSubmitResponse, status_code=202)
+async def submit_create_deck_from_topic_job(request: TopicDeckRequest):
+    job_id = submit_topic_job(request)
+    return {"job_id": job_id, "status": "queued"}
+
+@router.get("/jobs/{job_id}", response_model=DeckJobStatus)
+async def deck_job_status(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+@router.get("/jobs/{job_id}/result", response_model=List[Flashcard])
+async def deck_job_result(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}.")
+    return get_job_result(job_id) or []
 
 
 @router.post("/confirm/",response_model=DeckCreationResult) 
 async def confirm_deck(request: ConfirmDeckRequest): 
-    result = create_deck_from_request(request)
-    return result
+    try:
+        return await build_deck(request)
+    except asyncio.QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.post("/confirm/bulk/", response_model=BulkConfirmDeckResponse)
+async def confirm_decks_bulk(request: BulkConfirmDeckRequest):
+    """Construye varios mazos en paralelo; cada uno informa de su resultado y tiempos."""
+    return await build_decks_bulk(request.decks)
+
+@router.post("/append/", response_model=DeckAppendResult)
+async def append_deck(request: AppendDeckRequest):
+    """
+    Añade tarjetas a un mazo existente sin cambiar su deck_id; el .apkg se
+    reescribe con todas las notas y las ya importadas en Anki se actualizan.
+    """
+    try:
+        return await append_to_deck(request.deck_id, request.flashc)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except asyncio.QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.get("/builds/stats", response_model=DeckBuildStats)
+async def deck_builds_stats():
+    return deck_build_stats()
 
 
 @router.get("/list/", response_model=List[DeckCreationResult])
-async def list_metadata():
-    return list_deck_metadata()
+async def list_metadata(
+    response: Response,
+    template_id: Optional[int] = Query(None, description="Solo los mazos creados con este template"),
+    sort: Literal["created", "name", "id"] = Query("created", description="Campo de ordenación"),
+    order: Literal["asc", "desc"] = Query("desc", description="Sentido de la ordenación"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Tamaño de página (por defecto todos)"),
+    offset: int = Query(0, ge=0, description="Mazos a saltar antes de la página"),
+):
+    """El total de mazos que cumplen el filtro va en la cabecera X-Total-Count."""
+    decks, total = list_deck_metadata(template_id, sort, order == "desc", limit, offset)
+    response.headers["X-Total-Count"] = str(total)
+    return decks
 
 @router.delete("/delete/" , response_model=DeckDeleteResponse)
 async def delete_deck(request: DeckDeleteRequest):
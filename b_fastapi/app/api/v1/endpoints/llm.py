@@ -1,6 +1,10 @@
 from fastapi import APIRouter, HTTPException
 from services.llm_service import query_llm
-from schemas.llm_schema import LLMRequest, LLMResponse
+from services.llm_cache import cache_stats, clear_cache
+from services.llm_backends import backend_pool
+from schemas.llm_schema import LLMRequest, LLMResponse, LLMCacheStats, LLMBackendStatus
+from typing import List
+import asyncio
 
 router = APIRouter()
 
@@ -11,3 +15,15 @@ async def query_model(request: LLMRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=repr(e))
 
+@router.get("/cache/stats", response_model=LLMCacheStats)
+async def llm_cache_stats():
+    return await asyncio.to_thread(cache_stats)
+
+@router.delete("/cache", response_model=LLMCacheStats)
+async def llm_cache_clear():
+    await asyncio.to_thread(clear_cache)
+    return await asyncio.to_thread(cache_stats)
+
+@router.get("/backends", response_model=List[LLMBackendStatus])
+async def llm_backends_status():
+    return backend_pool.status()
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response, Query
+from typing import Literal, Optional
 from schemas.template_schema import TemplateCreateRequest, TemplateResponse, TemplateDeleteRequest , TemplateDeleteResponse
 from services.templates_service import (
     create_template_file,
@@ -22,5 +23,14 @@ async def delete_template(request: TemplateDeleteRequest):
 
 
 @router.get("/list/", response_model=list[TemplateResponse])
-async def list_templates():
-    return list_all_templates()
+async def list_templates(
+    response: Response,
+    sort: Literal["created", "name", "id"] = Query("created", description="Campo de ordenación"),
+    order: Literal["asc", "desc"] = Query("desc", description="Sentido de la ordenación"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Tamaño de página (por defecto todos)"),
+    offset: int = Query(0, ge=0, description="Templates a saltar antes de la página"),
+):
+    """El total de templates va en la cabecera X-Total-Count."""
+    templates, total = list_all_templates(sort, order == "desc", limit, offset)
+    response.headers["X-Total-Count"] = str(total)
+    return templates
@@ -1,13 +1,21 @@
+from __future__ import annotations
 from fastapi import Header, HTTPException
-from appwrite.client import Client
-from appwrite.services.account import Account
-from dotenv import load_dotenv
-from typing import Tuple
+from functools import lru_cache
+from typing import Tuple, TYPE_CHECKING
 import os
 
-load_dotenv()
+# appwrite y dotenv se importan en la primera petición autenticada, no al arrancar
+if TYPE_CHECKING:
+    from appwrite.client import Client
+
+@lru_cache(maxsize=None)
+def _load_env():
+    from dotenv import load_dotenv
+    load_dotenv()
 
 def get_appwrite_client():
+    from appwrite.client import Client
+    _load_env()
     client = Client()
     client.set_endpoint(os.getenv("APPWRITE_ENDPOINT","http://appwrite/v1"))
     client.set_project(os.getenv("APPWRITE_PROJECT_ID", "project_id")) 
@@ -17,6 +25,7 @@ async def get_authenticated_client(secret: str = Header(...)) -> Tuple[Client, s
     client = get_appwrite_client()
     client.set_session(secret)
     try:
+        from appwrite.services.account import Account
         account = Account(client)
         user = account.get()  
         return client, user["$id"]
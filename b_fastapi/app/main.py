@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from api.v1.endpoints import llm 
@@ -5,8 +6,25 @@ from api.v1.endpoints import decks
 from api.v1.endpoints import templates
 from api.v1.endpoints import users 
 from api.v1.endpoints import sync
+from services.http_client import start_http_client, close_http_client
+from services.llm_backends import start_backend_health_checks, stop_backend_health_checks
+from services.jobs_service import start_job_workers, stop_job_workers
+from services.chunking import stop_pdf_workers
+from services.deck_creator import stop_deck_builders
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	await start_http_client()
+	start_backend_health_checks()
+	start_job_workers()
+	yield
+	await stop_job_workers()
+	stop_pdf_workers()
+	stop_deck_builders()
+	await stop_backend_health_checks()
+	await close_http_client()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
 	CORSMiddleware,
@@ -14,6 +32,7 @@ app.add_middleware(
 	allow_credentials=True,
 	allow_methods=["*"],
 	allow_headers=["*"],
+	expose_headers=["X-Total-Count", "X-Document-Id", "X-Skip-Report"],
 )
 
 app.include_router(llm.router, prefix="/llm", tags=["LLM"])
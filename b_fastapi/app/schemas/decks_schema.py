@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator 
-from typing import List
+from typing import Dict, List, Literal, Optional
 
 class Flashcard(BaseModel):
     campos_anverso: List[str] = Field(..., description="Campos generados para el anverso de la tarjeta") 
@@ -27,10 +27,20 @@ class PromptInstructions(BaseModel):
     system_prompt: str = Field(..., description="Prompt base o instrucción general del modelo")
     temperature: float = Field(0.7, description="Nivel de creatividad del modelo (0.0 - 1.0)")
     max_tokens: int = Field(2048, description="Número máximo de tokens a generar")
+    use_cache: bool = Field(True, description="Reutilizar respuestas en caché del modelo para peticiones idénticas")
+    stream: bool = Field(False, description="Recibir la respuesta del modelo en streaming y cortar la generación al cerrarse el JSON de tarjetas")
 
 class CreateDeckRequest(BaseModel):
     template: TemplateFields
     prompt: PromptInstructions
+    concurrency: Optional[int] = Field(None, ge=1, description="Número máximo de chunks procesados en paralelo por el modelo (por defecto LLM_CONCURRENCY)")
+    pack_size: int = Field(1, ge=1, le=16, description="Número de chunks empaquetados en cada petición al modelo (1 = un chunk por petición)")
+    chunking: Literal["chars", "tokens"] = Field("chars", description="Modo de división: 'chars' (tamaño fijo) o 'tokens' (ajustado al contexto del modelo cargado)")
+    dedup: bool = Field(True, description="Eliminar tarjetas casi duplicadas entre chunks")
+    dedup_threshold: Optional[float] = Field(None, ge=0.0, le=1.0, description="Similitud (0-1) a partir de la cual dos tarjetas se consideran duplicadas (por defecto DEDUP_THRESHOLD)")
+    skip_boilerplate: bool = Field(True, description="Quitar encabezados/pies repetidos y descartar chunks sin contenido o duplicados antes de llamar al modelo")
+    pages: Optional[str] = Field(None, description="Páginas a procesar, p. ej. '1-20,35,40-' (desde 1; por defecto todas)")
+    document_id: Optional[str] = Field(None, description="ID (sha256) de un PDF subido antes; permite generar sin volver a subir el archivo")
 
 class ConfirmDeckRequest(BaseModel):
     deckname : str = Field(..., description="Nombre del mazo a confirmar")
@@ -44,6 +54,45 @@ class DeckCreationResult(BaseModel):
     template_name: str = Field(..., description="Nombre del template usado")
     template_id: int = Field(..., description="ID del template usado")
 
+class AppendDeckRequest(BaseModel):
+    deck_id: int = Field(..., description="ID del mazo existente al que se añaden las tarjetas")
+    flashc: List[Flashcard] = Field(..., description="Tarjetas nuevas")
+
+class DeckAppendResult(DeckCreationResult):
+    added: int = Field(..., description="Tarjetas añadidas")
+    duplicates: int = Field(..., description="Tarjetas omitidas por estar ya en el mazo")
+    total_cards: int = Field(..., description="Tarjetas del mazo tras añadir")
+
+class BulkConfirmDeckRequest(BaseModel):
+    decks: List[ConfirmDeckRequest] = Field(..., min_length=1, description="Mazos a construir")
+
+class BulkDeckResult(BaseModel):
+    deck_name: str = Field(..., description="Nombre del mazo pedido")
+    status: str = Field(..., description="completed o failed")
+    deck: Optional[DeckCreationResult] = Field(None, description="Mazo creado si la construcción terminó bien")
+    error: Optional[str] = Field(None, description="Motivo del fallo")
+    cards: int = Field(..., description="Tarjetas del mazo")
+    wait_seconds: float = Field(..., description="Espera hasta tener un proceso libre")
+    build_seconds: float = Field(..., description="Duración de la construcción del .apkg")
+
+class BulkConfirmDeckResponse(BaseModel):
+    workers: int = Field(..., description="Procesos usados para construir en paralelo")
+    completed: int = Field(..., description="Mazos construidos")
+    failed: int = Field(..., description="Mazos que fallaron")
+    total_seconds: float = Field(..., description="Duración total del lote")
+    results: List[BulkDeckResult] = Field(..., description="Resultado de cada mazo, en el orden pedido")
+
+class DeckBuildStats(BaseModel):
+    workers: int = Field(..., description="Procesos que construyen .apkg en paralelo")
+    max_queue: int = Field(..., description="Máximo de mazos esperando turno antes de rechazar con 503")
+    queued: int = Field(..., description="Mazos esperando un proceso libre")
+    running: int = Field(..., description="Mazos construyéndose ahora")
+    completed: int = Field(..., description="Mazos construidos desde el arranque")
+    failed: int = Field(..., description="Construcciones fallidas desde el arranque")
+    rejected: int = Field(..., description="Peticiones rechazadas por cola llena desde el arranque")
+    avg_wait_seconds: float = Field(..., description="Espera media en cola")
+    avg_build_seconds: float = Field(..., description="Duración media de la construcción")
+
 class DeckDeleteRequest(BaseModel):
     deck_id: int = Field(..., description="ID único del mazo a eliminar")
 
@@ -54,3 +103,26 @@ class TopicDeckRequest(BaseModel):
     topic: str = Field(..., description="Tema principal del cual se derivarán los conceptos")
     prompt: PromptInstructions = Field(..., description="Prompt del sistema para generar tarjetas (no se usa en la expansión)")
     template: TemplateFields = Field(..., description="Template para definir campos de anverso y reverso")
+    concurrency: Optional[int] = Field(None, ge=1, description="Número máximo de conceptos procesados en paralelo por el modelo (por defecto LLM_CONCURRENCY)")
+    dedup: bool = Field(True, description="Eliminar tarjetas casi duplicadas entre chunks")
+    dedup_threshold: Optional[float] = Field(None, ge=0.0, le=1.0, description="Similitud (0-1) a partir de la cual dos tarjetas se consideran duplicadas (por defecto DEDUP_THRESHOLD)")
+    max_concepts: Optional[int] = Field(None, ge=1, description="Máximo de conceptos a expandir; se eligen primero los de nivel más alto del esquema")
+    max_llm_calls: Optional[int] = Field(None, ge=3, description="Máximo de llamadas al modelo (1 para el esquema y 2 por concepto)")
+    time_limit_seconds: Optional[float] = Field(None, gt=0, description="Pasado este tiempo no se empiezan expansiones nuevas; las tarjetas de las ya expandidas se generan igual")
+
+class DeckJobSubmitResponse(BaseModel):
+    job_id: str = Field(..., description="ID del job de generación")
+    status: str = Field(..., description="Estado inicial del job")
+    document_id: Optional[str] = Field(None, description="ID del documento para reutilizarlo en otras peticiones")
+
+class DeckJobStatus(BaseModel):
+    job_id: str = Field(..., description="ID del job de generación")
+    kind: str = Field(..., description="Tipo de job: 'pdf' o 'topic'")
+    status: str = Field(..., description="queued, running, completed o failed")
+    progress_done: int = Field(..., description="Chunks/conceptos procesados")
+    progress_total: int = Field(..., description="Total de chunks/conceptos (0 mientras no se conoce)")
+    failed_chunks: int = Field(..., description="Chunks/conceptos descartados por error")
+    error: Optional[str] = Field(None, description="Mensaje de error si el job falló")
+    skipped: Optional[Dict[str, int]] = Field(None, description="Líneas repetidas y chunks descartados por el filtro previo (solo jobs de PDF)")
+    created_at: float = Field(..., description="Fecha de creación (epoch)")
+    updated_at: float = Field(..., description="Última actualización (epoch)")
@@ -9,7 +9,26 @@ class LLMRequest(BaseModel):
     messages: List[Message] = Field(..., description="List of messages in the conversation")
     temperature: Optional[float] = Field(0.7, description="Sampling temperature for the model")
     max_tokens: Optional[int] = Field(1000, description="Maximum number of tokens in the response") 
+    use_cache: bool = Field(True, description="Reuse a cached response for an identical request if available")
 
 class LLMResponse(BaseModel):
     response: str = Field(..., description="Response from the language model")
 
+
+class LLMCacheStats(BaseModel):
+    enabled: bool = Field(..., description="Whether the response cache is enabled")
+    hits: int = Field(..., description="Cache hits since startup")
+    misses: int = Field(..., description="Cache misses since startup")
+    evictions: int = Field(..., description="Entries evicted since startup")
+    entries: int = Field(..., description="Entries currently stored")
+    size_bytes: int = Field(..., description="Total size of stored responses in bytes")
+    max_bytes: int = Field(..., description="Maximum cache size in bytes")
+
+class LLMBackendStatus(BaseModel):
+    url: str = Field(..., description="Base URL of the LM Studio / llama.cpp server")
+    healthy: bool = Field(..., description="False while the backend is ejected")
+    outstanding: int = Field(..., description="Requests currently in flight")
+    max_concurrency: int = Field(..., description="Maximum concurrent requests for this backend")
+    consecutive_failures: int = Field(..., description="Failures since the last successful request")
+    latency_ewma: Optional[float] = Field(None, description="Moving average of request latency in seconds")
+    total_requests: int = Field(..., description="Requests routed to this backend since startup")
@@ -0,0 +1,150 @@
+from pathlib import Path
+from pydantic import BaseModel, ValidationError
+from schemas.decks_schema import DeckCreationResult
+from schemas.template_schema import TemplateResponse
+import json
+import os
+import sqlite3
+import threading
+
+# Índice de los metadatos de mazos (/app/deck_meta) y de los templates
+# (/app/templates). Los JSON siguen siendo la fuente de verdad; en cada
+# consulta se recorre el directorio comparando el mtime de cada archivo con
+# el guardado y solo se vuelven a leer los que cambiaron (el mtime del
+# directorio no cambia al editar un archivo en su sitio). Lo que se escribe
+# desde la app se actualiza al momento.
+CATALOG_DIR = Path(os.getenv("CATALOG_DIR", "/app/cache"))
+DECK_META_DIR = Path("/app/deck_meta")
+TEMPLATES_DIR = Path("/app/templates")
+
+# tipo -> (directorio, modelo, campo id, campo nombre)
+_SOURCES: dict[str, tuple[Path, type[BaseModel], str, str]] = {
+    "deck": (DECK_META_DIR, DeckCreationResult, "deck_id", "deck_name"),
+    "template": (TEMPLATES_DIR, TemplateResponse, "template_id", "template_name"),
+}
+_SORT_COLUMNS = {"created": "created_at", "name": "name COLLATE NOCASE", "id": "item_id"}
+
+_lock = threading.Lock()
+_conn: sqlite3.Connection | None = None
+
+def _get_conn() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        CATALOG_DIR.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(CATALOG_DIR / "catalog.sqlite", check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                kind TEXT NOT NULL,
+                file_name TEXT NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                item_id INTEGER,
+                name TEXT,
+                template_id INTEGER,
+                created_at REAL NOT NULL,
+                data TEXT,
+                PRIMARY KEY (kind, file_name)
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_item ON entries(kind, item_id);
+            CREATE INDEX IF NOT EXISTS idx_entries_created ON entries(kind, created_at);
+            CREATE INDEX IF NOT EXISTS idx_entries_name ON entries(kind, name COLLATE NOCASE);
+            CREATE INDEX IF NOT EXISTS idx_entries_template ON entries(kind, template_id);
+        """)
+        _conn.commit()
+    return _conn
+
+def _parse(kind: str, path: Path) -> BaseModel | None:
+    model = _SOURCES[kind][1]
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return model(**json.load(f))
+    except (OSError, ValueError, TypeError, ValidationError):
+        # los archivos inválidos quedan indexados sin datos para no releerlos
+        return None
+
+def _store(conn: sqlite3.Connection, kind: str, file_name: str, stat: os.stat_result, item: BaseModel | None):
+    _, _, id_field, name_field = _SOURCES[kind]
+    values = (None, None, None, None)
+    if item is not None:
+        values = (getattr(item, id_field), getattr(item, name_field), item.template_id, item.model_dump_json())
+    conn.execute(
+        """
+        INSERT INTO entries (kind, file_name, mtime_ns, item_id, name, template_id, created_at, data)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(kind, file_name) DO UPDATE SET
+            mtime_ns = excluded.mtime_ns, item_id = excluded.item_id, name = excluded.name,
+            template_id = excluded.template_id, data = excluded.data
+        """,
+        (kind, file_name, stat.st_mtime_ns, *values[:3], stat.st_mtime, values[3]),
+    )
+
+def _refresh(conn: sqlite3.Connection, kind: str):
+    directory = _SOURCES[kind][0]
+    directory.mkdir(parents=True, exist_ok=True)
+    known = dict(conn.execute("SELECT file_name, mtime_ns FROM entries WHERE kind = ?", (kind,)).fetchall())
+    changed = False
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.name.endswith(".json") or not entry.is_file():
+                continue
+            stat = entry.stat()
+            if known.pop(entry.name, None) != stat.st_mtime_ns:
+                _store(conn, kind, entry.name, stat, _parse(kind, Path(entry.path)))
+                changed = True
+    if changed or known:
+        conn.executemany("DELETE FROM entries WHERE kind = ? AND file_name = ?", [(kind, name) for name in known])
+        conn.commit()
+
+def index_file(kind: str, path: Path, item: BaseModel):
+    """Registra un JSON recién escrito por la app sin esperar al siguiente recorrido."""
+    with _lock:
+        conn = _get_conn()
+        _store(conn, kind, path.name, path.stat(), item)
+        conn.commit()
+
+def remove_file(kind: str, path: Path):
+    with _lock:
+        conn = _get_conn()
+        conn.execute("DELETE FROM entries WHERE kind = ? AND file_name = ?", (kind, path.name))
+        conn.commit()
+
+def query_items(
+    kind: str,
+    template_id: int | None = None,
+    sort: str = "created",
+    descending: bool = True,
+    limit: int | None = None,
+    offset: int = 0
+) -> tuple[list[dict], int]:
+    """Devuelve (página de elementos, total que cumple el filtro)."""
+    where, params = "kind = ? AND data IS NOT NULL", [kind]
+    if template_id is not None:
+        where += " AND template_id = ?"
+        params.append(template_id)
+    order = f"{_SORT_COLUMNS[sort]} {'DESC' if descending else 'ASC'}, file_name"
+
+    with _lock:
+        conn = _get_conn()
+        _refresh(conn, kind)
+        total = conn.execute(f"SELECT COUNT(*) FROM entries WHERE {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT data FROM entries WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?",
+            (*params, -1 if limit is None else limit, offset),
+        ).fetchall()
+    return [json.loads(data) for (data,) in rows], total
+
+def get_item(kind: str, item_id: int) -> dict | None:
+    with _lock:
+        conn = _get_conn()
+        _refresh(conn, kind)
+        row = conn.execute(
+            "SELECT data FROM entries WHERE kind = ? AND item_id = ? AND data IS NOT NULL", (kind, item_id)
+        ).fetchone()
+    return json.loads(row[0]) if row else None
+
+def item_ids(kind: str) -> set[int]:
+    with _lock:
+        conn = _get_conn()
+        _refresh(conn, kind)
+        rows = conn.execute("SELECT item_id FROM entries WHERE kind = ? AND data IS NOT NULL", (kind,)).fetchall()
+    return {item_id for (item_id,) in rows}
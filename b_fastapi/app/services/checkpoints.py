@@ -0,0 +1,86 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Checkpoints por chunk: las tarjetas de cada chunk se guardan en cuanto se
+# generan, para que un reintento del mismo documento solo procese los que faltan.
+CHECKPOINTS_ENABLED = os.getenv("CHECKPOINTS_ENABLED", "true").lower() not in ("0", "false", "no")
+CHECKPOINT_DIR = Path(os.getenv("CHECKPOINT_DIR", "/app/cache"))
+CHECKPOINT_TTL_HOURS = float(os.getenv("CHECKPOINT_TTL_HOURS", "72"))
+
+_lock = threading.Lock()
+_conn: sqlite3.Connection | None = None
+
+def _get_conn() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(CHECKPOINT_DIR / "checkpoints.sqlite", check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS chunk_checkpoints (
+                run_key TEXT NOT NULL,
+                chunk_idx INTEGER NOT NULL,
+                cards TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (run_key, chunk_idx)
+            )
+        """)
+        # los checkpoints viejos ya no sirven para reanudar nada
+        _conn.execute(
+            "DELETE FROM chunk_checkpoints WHERE created_at < ?",
+            (time.time() - CHECKPOINT_TTL_HOURS * 3600,),
+        )
+        _conn.commit()
+    return _conn
+
+def make_run_key(chunks: list[str], template_json: str, prompt_json: str, label: str) -> str:
+    """
+    Clave de una ejecución: hash del documento (sus chunks), la plantilla,
+    el prompt y el tipo de chunk. El índice del chunk va aparte.
+    """
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(hashlib.sha256(chunk.encode("utf-8")).digest())
+    digest.update(template_json.encode("utf-8"))
+    digest.update(prompt_json.encode("utf-8"))
+    digest.update(label.encode("utf-8"))
+    return digest.hexdigest()
+
+def make_document_run_key(document_hash: str, settings_json: str, template_json: str, prompt_json: str, label: str) -> str:
+    """
+    Igual que `make_run_key` para la ingesta en streaming, donde los chunks no
+    se conocen de antemano: el documento se identifica por el hash del PDF y
+    los ajustes que determinan cómo se corta (selección de páginas, tamaño...).
+    """
+    digest = hashlib.sha256()
+    for part in (document_hash, settings_json, template_json, prompt_json, label):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def load_checkpoints(run_key: str) -> dict[int, list]:
+    with _lock:
+        rows = _get_conn().execute(
+            "SELECT chunk_idx, cards FROM chunk_checkpoints WHERE run_key = ?", (run_key,)
+        ).fetchall()
+    return {idx: json.loads(cards) for idx, cards in rows}
+
+def save_checkpoint(run_key: str, chunk_idx: int, cards: list):
+    with _lock:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO chunk_checkpoints (run_key, chunk_idx, cards, created_at) VALUES (?, ?, ?, ?)",
+            (run_key, chunk_idx, json.dumps(cards, ensure_ascii=False), time.time()),
+        )
+        conn.commit()
+
+def clear_checkpoints(run_key: str):
+    with _lock:
+        conn = _get_conn()
+        conn.execute("DELETE FROM chunk_checkpoints WHERE run_key = ?", (run_key,))
+        conn.commit()
@@ -1,17 +1,189 @@
-import fitz  # PyMuPDF
-from typing import List
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import asyncio
+import hashlib
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Callable, List
+from services.text_splitter import RecursiveTextSplitter
 from fastapi import UploadFile
 
-async def extract_text_from_pdf(pdf_file: UploadFile) -> str:
-    contents = await pdf_file.read()
-    with fitz.open(stream=contents, filetype="pdf") as doc:
-        return "\n\n".join(page.get_text() for page in doc)
+# Aproximación de caracteres por token para texto en español/inglés; se
+# redondea hacia abajo para no pasarse del contexto del modelo.
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", "3.5"))
+
+# Extracción de texto en un pool de procesos para no bloquear el event loop.
+# Los documentos con menos de PDF_PAGES_PER_TASK páginas se extraen en un hilo.
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "32"))
+
+SPOOL_BLOCK_SIZE = 1 << 20
+
+# Ventana (en caracteres) que acumula el splitter incremental antes de cortar.
+STREAM_SPLIT_WINDOW = int(os.getenv("STREAM_SPLIT_WINDOW", "64000"))
+
+_executor: ProcessPoolExecutor | None = None
+
+def _extract_page_list(path: str, page_numbers: List[int]) -> List[str]:
+    # se ejecuta en los procesos del pool: cada tarea abre el PDF por su cuenta
+    import fitz
+    with fitz.open(path) as doc:
+        return [doc[n].get_text() for n in page_numbers]
+
+def _page_count(path: str) -> int:
+    import fitz
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+def parse_page_selection(selection: str | None, page_count: int) -> List[int]:
+    """
+    Convierte una selección tipo "1-20,35,40-" (páginas desde 1, rangos
+    inclusivos, "40-" = hasta el final) en índices de página desde 0.
+    """
+    if not selection or not selection.strip():
+        return list(range(page_count))
+
+    selected = set()
+    for part in selection.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            if "-" in part:
+                start, end = part.split("-", 1)
+                first = int(start) if start.strip() else 1
+                last = int(end) if end.strip() else page_count
+            else:
+                first = last = int(part)
+        except ValueError:
+            raise ValueError(f"Invalid page selection: '{part}'")
+        if first < 1 or last < first:
+            raise ValueError(f"Invalid page range: '{part}'")
+        selected.update(range(first - 1, min(last, page_count)))
+
+    if not selected:
+        raise ValueError(f"Page selection '{selection}' is outside the document ({page_count} pages).")
+    return sorted(selected)
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=max(1, PDF_EXTRACT_WORKERS))
+    return _executor
+
+def stop_pdf_workers():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+async def spool_upload(pdf_file: UploadFile, directory: str | Path | None = None) -> tuple[Path, str]:
+    """
+    Copia el PDF subido a un archivo temporal por bloques (sin cargarlo
+    entero en memoria) y devuelve su ruta y el sha256 del contenido.
+    """
+    digest = hashlib.sha256()
+    tmp = tempfile.NamedTemporaryFile(suffix=".pdf", dir=directory, delete=False)
+    try:
+        with tmp:
+            while block := await pdf_file.read(SPOOL_BLOCK_SIZE):
+                digest.update(block)
+                tmp.write(block)
+    except BaseException:
+        Path(tmp.name).unlink(missing_ok=True)
+        raise
+    return Path(tmp.name), digest.hexdigest()
+
+def file_sha256(path: str | Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(SPOOL_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+async def pdf_page_count(path: str | Path) -> int:
+    return await asyncio.to_thread(_page_count, str(path))
+
+async def iter_pages_from_pdf_path(path: str | Path, page_numbers: List[int]) -> AsyncIterator[tuple[int, str]]:
+    """
+    Produce `(página, texto)` de las páginas pedidas en orden, sin bloquear el
+    event loop. Las páginas se extraen por tandas de PDF_PAGES_PER_TASK en el
+    pool de procesos, con como mucho PDF_EXTRACT_WORKERS tandas por delante
+    del consumidor, así que la memoria no depende del tamaño del documento.
+    """
+    path = str(path)
+    batches = [page_numbers[i:i + PDF_PAGES_PER_TASK] for i in range(0, len(page_numbers), PDF_PAGES_PER_TASK)]
+
+    loop = asyncio.get_running_loop()
+    def submit(batch: List[int]) -> asyncio.Future:
+        if PDF_EXTRACT_WORKERS <= 1 or len(batches) == 1:
+            return asyncio.ensure_future(asyncio.to_thread(_extract_page_list, path, batch))
+        return loop.run_in_executor(_get_executor(), _extract_page_list, path, batch)
+
+    ahead = max(1, PDF_EXTRACT_WORKERS)
+    pending = deque((batch, submit(batch)) for batch in batches[:ahead])
+    next_batch = len(pending)
+    try:
+        while pending:
+            batch, future = pending.popleft()
+            texts = await future
+            if next_batch < len(batches):
+                pending.append((batches[next_batch], submit(batches[next_batch])))
+                next_batch += 1
+            for page_no, text in zip(batch, texts):
+                yield page_no, text
+    finally:
+        for _, future in pending:
+            future.cancel()
 
 def chunk_text(text: str, chunk_size=800, overlap=150) -> List[str]:
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=overlap,
-        separators=["\n\n", "\n", ".", "!", "?", ",", " "]
+    return RecursiveTextSplitter(chunk_size, overlap).split_text(text)
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+def chunk_text_by_tokens(text: str, max_tokens: int, overlap_ratio: float = 0.1) -> List[str]:
+    """
+    Igual que `chunk_text`, pero el tamaño de cada chunk se mide en tokens
+    estimados en lugar de caracteres.
+    """
+    splitter = RecursiveTextSplitter(
+        chunk_size=max_tokens,
+        chunk_overlap=int(max_tokens * overlap_ratio),
+        length_function=estimate_tokens,
     )
     return splitter.split_text(text)
+
+class IncrementalSplitter:
+    """
+    Aplica `split` a texto que llega por partes (páginas): acumula hasta
+    `window` caracteres, corta, entrega todos los chunks menos el último y lo
+    conserva como inicio de la siguiente ventana, para que los cortes queden
+    donde los pondría el splitter sobre el documento completo.
+    """
+
+    def __init__(self, split: Callable[[str], List[str]], window: int = STREAM_SPLIT_WINDOW):
+        self.split = split
+        self.window = window
+        self._parts: List[str] = []
+        self._size = 0
+
+    def feed(self, text: str) -> List[str]:
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size < self.window:
+            return []
+        chunks = self.split("\n\n".join(self._parts))
+        carry = chunks.pop() if chunks else ""
+        self._parts = [carry] if carry else []
+        self._size = len(carry)
+        return chunks
+
+    def flush(self) -> List[str]:
+        if not self._parts:
+            return []
+        chunks = self.split("\n\n".join(self._parts))
+        self._parts = []
+        self._size = 0
+        return chunks
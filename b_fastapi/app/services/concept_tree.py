@@ -0,0 +1,168 @@
+from dataclasses import dataclass, field
+import os
+import re
+import string
+
+# Convierte el esquema del modelo (texto con títulos, numeraciones y viñetas
+# anidadas) en un árbol de conceptos, descartando líneas de relleno y
+# duplicadas, y elige qué nodos expandir dentro de un presupuesto.
+
+# Niveles del árbol que se expanden por separado (1 = solo el nivel superior);
+# los más profundos se resumen dentro de su antecesor seleccionado.
+CONCEPT_MAX_DEPTH = int(os.getenv("CONCEPT_MAX_DEPTH", "2"))
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+_NUMBERED = re.compile(r"^((?:\d+\.)+\d*|\d+\)|[IVXLC]+[.)]|[a-zA-Z][.)])\s+(.*)$")
+_ROMAN = re.compile(r"^(X{0,3})(IX|IV|V?I{0,3})$")
+_BOLD = re.compile(r"(\*\*|__)(.+?)\1")
+_BULLET = re.compile(r"^[-*•·+◦▪–]\s+(.*)$")
+_DECORATION = re.compile(r"[*_`]+")
+_PREAMBLE = re.compile(r"^(aqu[ií] tienes|a continuaci[oó]n|este es|este esquema|here is|below is)\b", re.IGNORECASE)
+_FILLER = re.compile(
+    r"^(esquema( maestro)?|[íi]ndice|estructura|notas?|resumen|conclusi[oó]n(es)?|outline)\W*$",
+    re.IGNORECASE,
+)
+_LIST_BASE = 10  # las listas quedan siempre por debajo de los títulos "#"
+# rango de cada tipo de línea dentro de una lista (menor = más general):
+# texto sin marcador (título) > "I." > "A." > "1." > "1.1." ... > "a)" > viñeta
+_RANK_PLAIN = 0
+_RANK_ROMAN = 1
+_RANK_UPPER = 2
+_RANK_DIGITS = 2  # + profundidad de la numeración
+_RANK_LOWER = 8
+_RANK_BULLET = 9
+_NORMALIZE = str.maketrans("áàäâéèëêíìïîóòöôúùüûñç", "aaaaeeeeiiiioooouuuunc", string.punctuation + "¿¡«»")
+
+@dataclass
+class ConceptNode:
+    text: str
+    level: int
+    position: int
+    children: list["ConceptNode"] = field(default_factory=list)
+
+def _clean(text: str) -> str:
+    text = _DECORATION.sub("", text).strip()
+    return text.rstrip(":").strip()
+
+def _key(text: str) -> str:
+    return " ".join(text.lower().translate(_NORMALIZE).split())
+
+def _is_trivial(text: str) -> bool:
+    letters = sum(ch.isalpha() for ch in text)
+    return letters < 3 or bool(_PREAMBLE.match(text) or _FILLER.match(text))
+
+def _strip_number(text: str) -> str:
+    numbered = _NUMBERED.match(text)
+    return numbered.group(2) if numbered else text
+
+def _line_level(line: str) -> tuple[int, str]:
+    """
+    Nivel relativo (menor = más general) y texto sin marcadores de una línea
+    del esquema. Los títulos markdown quedan siempre por encima de las listas;
+    dentro de una lista cuentan el tipo de marcador (ver los _RANK_*), la
+    profundidad de la numeración ("2.3" bajo "2.") y la sangría.
+    """
+    expanded = line.replace("\t", "    ")
+    indent = len(expanded) - len(expanded.lstrip(" "))
+    # "**1. Membrana**": la negrita no debe ocultar la numeración
+    stripped = _BOLD.sub(r"\2", line.strip())
+
+    heading = _HEADING.match(stripped)
+    if heading:
+        return len(heading.group(1)), _strip_number(_BOLD.sub(r"\2", heading.group(2)))
+
+    numbered = _NUMBERED.match(stripped)
+    if numbered:
+        marker = numbered.group(1).rstrip(".)")
+        if marker[0].isdigit():
+            rank = _RANK_DIGITS + marker.count(".") + 1
+        elif _ROMAN.match(marker):
+            rank = _RANK_ROMAN
+        elif marker.isupper():
+            rank = _RANK_UPPER
+        else:
+            rank = _RANK_LOWER
+        return _LIST_BASE + rank + indent // 2, numbered.group(2)
+
+    bullet = _BULLET.match(stripped)
+    if bullet:
+        return _LIST_BASE + _RANK_BULLET + indent // 2, bullet.group(1)
+
+    return _LIST_BASE + _RANK_PLAIN + indent // 2, stripped
+
+def parse_blueprint(text: str) -> list[ConceptNode]:
+    """
+    Devuelve los nodos raíz del esquema. Las líneas triviales (relleno,
+    separadores) se descartan y las repetidas se colapsan en la primera.
+    """
+    roots: list[ConceptNode] = []
+    stack: list[ConceptNode] = []
+    seen: set[str] = set()
+    position = 0
+    for raw in text.splitlines():
+        if not raw.strip():
+            continue
+        level, content = _line_level(raw)
+        content = _clean(content)
+        key = _key(content)
+        if _is_trivial(content) or key in seen:
+            continue
+        seen.add(key)
+
+        node = ConceptNode(content, level, position)
+        position += 1
+        while stack and stack[-1].level >= level:
+            stack.pop()
+        (stack[-1].children if stack else roots).append(node)
+        stack.append(node)
+
+    # un único título que lo engloba todo es el propio tema: se trabaja con sus hijos
+    while len(roots) == 1 and roots[0].children:
+        roots = roots[0].children
+    return roots
+
+def _walk(nodes: list[ConceptNode], depth: int = 0):
+    for node in nodes:
+        yield node, depth
+        yield from _walk(node.children, depth + 1)
+
+def _fold(node: ConceptNode, selected: set[int]) -> list[str]:
+    parts = []
+    for child in node.children:
+        if child.position in selected:
+            continue
+        nested = _fold(child, selected)
+        parts.append(f"{child.text} ({'; '.join(nested)})" if nested else child.text)
+    return parts
+
+def select_concepts(
+    roots: list[ConceptNode],
+    max_concepts: int | None = None,
+    max_depth: int | None = CONCEPT_MAX_DEPTH
+) -> list[tuple[str, int]]:
+    """
+    Elige hasta `max_concepts` nodos de los `max_depth` niveles superiores,
+    empezando por los de nivel más alto (en orden del esquema dentro de cada
+    nivel). Los descendientes que quedan fuera se resumen dentro del concepto
+    seleccionado más cercano para que el modelo los cubra al expandirlo.
+
+    Devuelve `(concepto, prioridad)` en orden del esquema; prioridad 0 es la
+    más alta.
+    """
+    candidates = _walk(roots)
+    if max_depth is not None:
+        candidates = (item for item in candidates if item[1] < max(1, max_depth))
+    by_priority = sorted(candidates, key=lambda item: (item[1], item[0].position))
+    if max_concepts is not None:
+        by_priority = by_priority[:max_concepts]
+    selected = {node.position for node, _ in by_priority}
+    priority = {node.position: rank for rank, (node, _) in enumerate(by_priority)}
+
+    concepts = []
+    for node, _ in _walk(roots):
+        if node.position not in selected:
+            continue
+        folded = _fold(node, selected)
+        text = f"{node.text}: incluye {'; '.join(folded)}" if folded else node.text
+        concepts.append((text, priority[node.position]))
+    return concepts
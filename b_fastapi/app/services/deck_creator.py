@@ -1,9 +1,17 @@
 from pathlib import Path
 from uuid import uuid4
-import genanki
 from schemas.decks_schema import ConfirmDeckRequest, DeckCreationResult 
+from services.catalog import DECK_META_DIR, index_file, remove_file, query_items, get_item
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+import asyncio
 import json
-from typing import List
+import os
+import sqlite3
+import tempfile
+import time
+import zipfile
+from typing import List, get_origin
 
 card_css = """
 .card {
@@ -33,72 +41,89 @@ hr#answer {
 }
 """ 
 
-metadata_dir = Path("/app/deck_meta")
+# Construcción de los .apkg en un pool de procesos para no bloquear el event
+# loop; como mucho DECK_BUILD_MAX_QUEUE mazos esperan turno a la vez.
+DECK_BUILD_WORKERS = int(os.getenv("DECK_BUILD_WORKERS", "2"))
+DECK_BUILD_MAX_QUEUE = int(os.getenv("DECK_BUILD_MAX_QUEUE", "32"))
+
+# Modelos de genanki ya compilados por template (en cada proceso del pool).
+NOTE_MODEL_CACHE_SIZE = int(os.getenv("NOTE_MODEL_CACHE_SIZE", "64"))
+
+# Almacén de notas por mazo (un SQLite por deck_id) para poder añadir
+# tarjetas sin regenerar el mazo desde la petición original.
+DECK_STORE_DIR = Path(os.getenv("DECK_STORE_DIR", "/app/deck_store"))
+
+# Las construcciones en lote usan su propio pool, de un proceso por núcleo,
+# para no competir por turno con las confirmaciones individuales.
+DECK_BULK_WORKERS = int(os.getenv("DECK_BULK_WORKERS", str(os.cpu_count() or 1)))
+
+_executor: ProcessPoolExecutor | None = None
+_bulk_executor: ProcessPoolExecutor | None = None
+_slots: asyncio.Semaphore | None = None
+_append_locks: dict[int, asyncio.Lock] = {}
+_stats = {"queued": 0, "running": 0, "completed": 0, "failed": 0, "rejected": 0, "wait_seconds": 0.0, "build_seconds": 0.0}
+
+metadata_dir = DECK_META_DIR
 metadata_dir.mkdir(parents=True, exist_ok=True)
 
 def save_deck_metadata(deck_result: DeckCreationResult):
     metadata_path = metadata_dir / f"{deck_result.deck_id}.json"
     with open(metadata_path, "w", encoding="utf-8") as f:
         json.dump(deck_result.dict(), f, ensure_ascii=False, indent=2)
+    index_file("deck", metadata_path, deck_result)
 
 
-def list_deck_metadata() -> List[DeckCreationResult]:
-    metadata_dir.mkdir(parents=True, exist_ok=True)
-    metadata_files = metadata_dir.glob("*.json")
-    results = []
-    for file in metadata_files:
-        try:
-            with open(file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                results.append(DeckCreationResult(**data))
-        except Exception:
-            continue
-    return results
+def list_deck_metadata(
+    template_id: int | None = None,
+    sort: str = "created",
+    descending: bool = True,
+    limit: int | None = None,
+    offset: int = 0
+) -> tuple[List[DeckCreationResult], int]:
+    """Devuelve (página de mazos, total) desde el índice del catálogo."""
+    items, total = query_items("deck", template_id, sort, descending, limit, offset)
+    return [DeckCreationResult(**data) for data in items], total
 
 def delete_deck_by_id(deck_id: int) -> bool:
     metadata_path = metadata_dir/ f"{deck_id}.json"
-    
-    if not metadata_path.exists():
+    metadata = get_item("deck", deck_id)
+
+    if metadata is None or not metadata_path.exists():
         return False
 
     try:
-        with open(metadata_path, "r", encoding="utf-8") as f:
-            metadata = json.load(f)
         apkg_path = Path(metadata.get("file_path", ""))
 
         if apkg_path.exists():
             apkg_path.unlink()
 
         metadata_path.unlink()
+        remove_file("deck", metadata_path)
+        (DECK_STORE_DIR / f"{deck_id}.sqlite").unlink(missing_ok=True)
 
         return True
     except Exception:
         return False
 
-def create_deck_from_request(data: ConfirmDeckRequest) -> DeckCreationResult:
-    deck_id = int(uuid4().int >> 96)  
-    model_id = data.template.template_id
-    model_name = data.template.template_name
-    front_fields = data.template.front
-    back_fields = data.template.back
-
-    total_fields = front_fields + back_fields
-
-    fields_schema = [{"name": f} for f in total_fields]
-
-    qfmt = '<div class="card">\n'
-    for f in front_fields:
-        qfmt += f'  <div class="my-question">{{{{{f}}}}}</div>\n'
-    qfmt += '</div>'
-
-    afmt = '{{FrontSide}}<hr id="answer">\n'
-    for f in back_fields:
-        afmt += f'  <div class="my-answer">{{{{{f}}}}}</div>\n'
+@lru_cache(maxsize=NOTE_MODEL_CACHE_SIZE)
+def _compile_model(template_id: int, template_name: str, front_fields: tuple, back_fields: tuple):
+    """
+    genanki.Model de un template, cacheado por su id y contenido. Reutilizar
+    el mismo objeto evita rehacer los formatos y que genanki vuelva a
+    calcular los campos requeridos de la plantilla en cada mazo.
+    """
+    import genanki  # solo al exportar un mazo
+    qfmt = '<div class="card">\n' + "".join(
+        f'  <div class="my-question">{{{{{f}}}}}</div>\n' for f in front_fields
+    ) + '</div>'
+    afmt = '{{FrontSide}}<hr id="answer">\n' + "".join(
+        f'  <div class="my-answer">{{{{{f}}}}}</div>\n' for f in back_fields
+    )
 
-    model = genanki.Model(
-        model_id=model_id,
-        name=model_name,
-        fields=fields_schema,
+    return genanki.Model(
+        model_id=template_id,
+        name=template_name,
+        fields=[{"name": f} for f in front_fields + back_fields],
         templates=[{
             'name': 'Template dinámico',
             'qfmt': qfmt,
@@ -107,22 +132,42 @@ def create_deck_from_request(data: ConfirmDeckRequest) -> DeckCreationResult:
         css=card_css,
     )
 
+@lru_cache(maxsize=None)
+def _card_field_plan(card_type: type) -> tuple[str | None, str | None]:
+    # atributos de la tarjeta con los valores de anverso y reverso; se buscan
+    # una vez por clase en lugar de recorrer el model_dump de cada tarjeta
+    def find(marker: str) -> str | None:
+        return next((name for name, info in card_type.model_fields.items()
+                     if marker in name.lower() and get_origin(info.annotation) is list), None)
+    return find("anverso"), find("reverso")
+
+def _note_fields(values: list, count: int) -> list:
+    values = values[:count]
+    return values + [""] * (count - len(values)) if len(values) < count else values
+
+def write_deck_package(data: ConfirmDeckRequest, deck_id: int) -> str:
+    """
+    Construye el .apkg y devuelve su ruta absoluta. No toca el catálogo ni
+    estado compartido, así que puede ejecutarse en un proceso del pool.
+    """
+    import genanki  # solo al exportar un mazo
+    template = data.template
+    model = _compile_model(template.template_id, template.template_name, tuple(template.front), tuple(template.back))
+    front_count = len(template.front)
+    back_count = len(template.back)
+
     deck = genanki.Deck(
         deck_id=deck_id,
         name=data.deckname,
     )
 
     for entry in data.flashc:
-        entry_dict = entry.model_dump()
-        front_values = next((v for k, v in entry_dict.items() if isinstance(v, list) and "anverso" in k.lower()), [])
-        back_values = next((v for k, v in entry_dict.items() if isinstance(v, list) and "reverso" in k.lower()), [])
-        padded_front = front_values + [""] * (len(front_fields) - len(front_values))
-        padded_back = back_values + [""] * (len(back_fields) - len(back_values))
-        fields_values = padded_front[:len(front_fields)] + padded_back[:len(back_fields)]
-
+        front_attr, back_attr = _card_field_plan(type(entry))
+        front_values = getattr(entry, front_attr) if front_attr else []
+        back_values = getattr(entry, back_attr) if back_attr else []
         note = genanki.Note(
             model=model,
-            fields=fields_values
+            fields=_note_fields(front_values, front_count) + _note_fields(back_values, back_count)
         )
         deck.add_note(note)
 
@@ -130,11 +175,98 @@ def create_deck_from_request(data: ConfirmDeckRequest) -> DeckCreationResult:
     output_dir.mkdir(exist_ok=True)
     output_path = output_dir / f"{data.deckname.replace(' ', '_')}_{deck_id}.apkg"
     genanki.Package(deck).write_to_file(str(output_path))
+    return str(output_path.resolve())
+
+def _read_apkg_notes(apkg_path: Path, template_id: int) -> tuple[dict, list[tuple[str, list[str]]]]:
+    """Template y notas (guid, campos) de un .apkg generado por genanki."""
+    with zipfile.ZipFile(apkg_path) as package, tempfile.TemporaryDirectory() as tmp:
+        collection = sqlite3.connect(package.extract("collection.anki2", tmp))
+        try:
+            models = json.loads(collection.execute("SELECT models FROM col").fetchone()[0])
+            notes = collection.execute("SELECT guid, flds FROM notes ORDER BY id").fetchall()
+        finally:
+            collection.close()
+
+    model = models.get(str(template_id)) or next(iter(models.values()))
+    names = [f["name"] for f in sorted(model["flds"], key=lambda f: f["ord"])]
+    qfmt = model["tmpls"][0]["qfmt"]
+    front = [name for name in names if f"{{{{{name}}}}}" in qfmt]
+    template = {
+        "template_id": int(model["id"]),
+        "template_name": model["name"],
+        "front": front,
+        "back": [name for name in names if name not in front],
+    }
+    return template, [(guid, flds.split("\x1f")) for guid, flds in notes]
+
+def _open_note_store(deck_id: int, apkg_path: Path, template_id: int) -> sqlite3.Connection:
+    store_path = DECK_STORE_DIR / f"{deck_id}.sqlite"
+    if not store_path.exists():
+        # mazos creados antes del almacén (o descargados por sync): se parte del .apkg
+        if not apkg_path.exists():
+            raise LookupError(f"Deck file not found: {apkg_path}")
+        template, notes = _read_apkg_notes(apkg_path, template_id)
+        DECK_STORE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = store_path.with_suffix(".tmp")
+        tmp_path.unlink(missing_ok=True)
+        conn = sqlite3.connect(tmp_path)
+        conn.executescript("""
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE notes (position INTEGER PRIMARY KEY, guid TEXT NOT NULL UNIQUE, fields TEXT NOT NULL);
+        """)
+        conn.execute("INSERT INTO meta (key, value) VALUES ('template', ?)", (json.dumps(template, ensure_ascii=False),))
+        conn.executemany("INSERT OR IGNORE INTO notes (guid, fields) VALUES (?, ?)",
+                         [(guid, json.dumps(fields, ensure_ascii=False)) for guid, fields in notes])
+        conn.commit()
+        conn.close()
+        os.replace(tmp_path, store_path)
+    return sqlite3.connect(store_path)
+
+def append_deck_package(deck_id: int, deck_name: str, file_path: str, template_id: int, cards: list) -> tuple[int, int, int]:
+    """
+    Guarda las tarjetas nuevas en el almacén del mazo y reescribe su .apkg con
+    todas las notas. El GUID de cada nota es el de genanki para sus campos y
+    se conserva, así Anki actualiza las notas que ya tiene al importar en
+    lugar de duplicarlas. Devuelve (añadidas, duplicadas, total).
+    """
+    import genanki  # solo al exportar un mazo
+    apkg_path = Path(file_path)
+    conn = _open_note_store(deck_id, apkg_path, template_id)
+    try:
+        template = json.loads(conn.execute("SELECT value FROM meta WHERE key = 'template'").fetchone()[0])
+        front_count = len(template["front"])
+        back_count = len(template["back"])
 
+        rows = []
+        for entry in cards:
+            front_attr, back_attr = _card_field_plan(type(entry))
+            fields = _note_fields(getattr(entry, front_attr) if front_attr else [], front_count) + \
+                _note_fields(getattr(entry, back_attr) if back_attr else [], back_count)
+            rows.append((genanki.guid_for(*fields), json.dumps(fields, ensure_ascii=False)))
+        before = conn.total_changes
+        conn.executemany("INSERT OR IGNORE INTO notes (guid, fields) VALUES (?, ?)", rows)
+        added = conn.total_changes - before
+        conn.commit()
+
+        model = _compile_model(template["template_id"], template["template_name"], tuple(template["front"]), tuple(template["back"]))
+        deck = genanki.Deck(deck_id=deck_id, name=deck_name)
+        for guid, fields in conn.execute("SELECT guid, fields FROM notes ORDER BY position"):
+            deck.add_note(genanki.Note(model=model, fields=_note_fields(json.loads(fields), front_count + back_count), guid=guid))
+    finally:
+        conn.close()
+
+    # se escribe aparte y se reemplaza para no dejar un .apkg a medias
+    apkg_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = apkg_path.with_name(apkg_path.name + ".tmp")
+    genanki.Package(deck).write_to_file(str(tmp_path))
+    os.replace(tmp_path, apkg_path)
+    return added, len(rows) - added, len(deck.notes)
+
+def _register_deck(data: ConfirmDeckRequest, deck_id: int, file_path: str) -> DeckCreationResult:
     result = DeckCreationResult(
     deck_name=data.deckname,
     deck_id=deck_id,
-    file_path=str(output_path.resolve()),
+    file_path=file_path,
     template_name=data.template.template_name,
     template_id=data.template.template_id
     )
@@ -143,4 +275,145 @@ def create_deck_from_request(data: ConfirmDeckRequest) -> DeckCreationResult:
 
     return result
 
+def create_deck_from_request(data: ConfirmDeckRequest) -> DeckCreationResult:
+    deck_id = int(uuid4().int >> 96)  
+    return _register_deck(data, deck_id, write_deck_package(data, deck_id))
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor, _slots
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=max(1, DECK_BUILD_WORKERS))
+        _slots = asyncio.Semaphore(max(1, DECK_BUILD_WORKERS))
+    return _executor
+
+def _get_bulk_executor() -> ProcessPoolExecutor:
+    global _bulk_executor
+    if _bulk_executor is None:
+        _bulk_executor = ProcessPoolExecutor(max_workers=max(1, DECK_BULK_WORKERS))
+    return _bulk_executor
+
+def stop_deck_builders():
+    global _executor, _slots, _bulk_executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        _slots = None
+    if _bulk_executor is not None:
+        _bulk_executor.shutdown(wait=False, cancel_futures=True)
+        _bulk_executor = None
+
+async def _run_build(fn, *args):
+    """
+    Ejecuta `fn(*args)` en el pool de construcción contando la espera y la
+    duración. Lanza asyncio.QueueFull si ya hay DECK_BUILD_MAX_QUEUE
+    construcciones esperando turno.
+    """
+    if _stats["queued"] >= DECK_BUILD_MAX_QUEUE:
+        _stats["rejected"] += 1
+        raise asyncio.QueueFull("Demasiados mazos en cola; inténtalo de nuevo más tarde.")
+
+    executor = _get_executor()
+    loop = asyncio.get_running_loop()
+    queued_at = time.perf_counter()
+    _stats["queued"] += 1
+    try:
+        await _slots.acquire()
+    finally:
+        _stats["queued"] -= 1
+    started_at = time.perf_counter()
+    _stats["running"] += 1
+    _stats["wait_seconds"] += started_at - queued_at
+    try:
+        result = await loop.run_in_executor(executor, fn, *args)
+    except Exception:
+        _stats["failed"] += 1
+        raise
+    finally:
+        _stats["running"] -= 1
+        _stats["build_seconds"] += time.perf_counter() - started_at
+        _slots.release()
+    _stats["completed"] += 1
+    return result
+
+async def build_deck(data: ConfirmDeckRequest) -> DeckCreationResult:
+    """
+    Igual que `create_deck_from_request`, pero la construcción del .apkg
+    (SQLite de genanki y zip) se hace en el pool de procesos.
+    """
+    deck_id = int(uuid4().int >> 96)  
+    file_path = await _run_build(write_deck_package, data, deck_id)
+    return _register_deck(data, deck_id, file_path)
+
+def _timed_write_deck_package(data: ConfirmDeckRequest, deck_id: int) -> tuple[str, float]:
+    started_at = time.perf_counter()
+    file_path = write_deck_package(data, deck_id)
+    return file_path, time.perf_counter() - started_at
+
+async def build_decks_bulk(requests: list[ConfirmDeckRequest]) -> dict:
+    """
+    Construye varios mazos en paralelo en el pool de lote. Un mazo que falla
+    no afecta a los demás: cada resultado lleva su estado, error y tiempos
+    (espera hasta tener proceso libre y duración de la construcción).
+    """
+    executor = _get_bulk_executor()
+    loop = asyncio.get_running_loop()
+    started_at = time.perf_counter()
+
+    async def build_one(data: ConfirmDeckRequest) -> dict:
+        deck_id = int(uuid4().int >> 96)  
+        submitted_at = time.perf_counter()
+        item = {"deck_name": data.deckname, "cards": len(data.flashc), "deck": None, "error": None}
+        try:
+            file_path, build_seconds = await loop.run_in_executor(executor, _timed_write_deck_package, data, deck_id)
+            item["deck"] = _register_deck(data, deck_id, file_path)
+            item["status"] = "completed"
+        except Exception as e:
+            print(f"Error al construir el mazo {data.deckname}: {e}")
+            build_seconds = 0.0
+            item["status"] = "failed"
+            item["error"] = str(e)
+        elapsed = time.perf_counter() - submitted_at
+        item["build_seconds"] = round(build_seconds, 3)
+        item["wait_seconds"] = round(max(0.0, elapsed - build_seconds), 3)
+        return item
+
+    results = await asyncio.gather(*(build_one(data) for data in requests))
+    completed = sum(1 for item in results if item["status"] == "completed")
+    return {
+        "workers": max(1, DECK_BULK_WORKERS),
+        "completed": completed,
+        "failed": len(results) - completed,
+        "total_seconds": round(time.perf_counter() - started_at, 3),
+        "results": results,
+    }
+
+async def append_to_deck(deck_id: int, cards: list) -> dict:
+    """
+    Añade tarjetas a un mazo existente conservando su deck_id y reescribe su
+    .apkg desde el almacén de notas. Lanza LookupError si el mazo no existe.
+    """
+    metadata = get_item("deck", deck_id)
+    if metadata is None:
+        raise LookupError(f"Deck {deck_id} not found.")
+
+    # dos anexos al mismo mazo a la vez podrían escribir el .apkg en desorden
+    lock = _append_locks.setdefault(deck_id, asyncio.Lock())
+    async with lock:
+        added, duplicates, total = await _run_build(
+            append_deck_package, deck_id, metadata["deck_name"], metadata["file_path"], metadata["template_id"], cards
+        )
+    return {**metadata, "added": added, "duplicates": duplicates, "total_cards": total}
 
+def deck_build_stats() -> dict:
+    finished = _stats["completed"] + _stats["failed"]
+    return {
+        "workers": max(1, DECK_BUILD_WORKERS),
+        "max_queue": DECK_BUILD_MAX_QUEUE,
+        "queued": _stats["queued"],
+        "running": _stats["running"],
+        "completed": _stats["completed"],
+        "failed": _stats["failed"],
+        "rejected": _stats["rejected"],
+        "avg_wait_seconds": round(_stats["wait_seconds"] / finished, 3) if finished else 0.0,
+        "avg_build_seconds": round(_stats["build_seconds"] / finished, 3) if finished else 0.0,
+    }
@@ -1,20 +1,39 @@
-from schemas.decks_schema import TemplateFields, PromptInstructions,Flashcard 
+from schemas.decks_schema import TemplateFields, PromptInstructions,Flashcard, TopicDeckRequest
 from schemas.llm_schema   import LLMRequest, LLMResponse, Message 
-from services.chunking import extract_text_from_pdf,chunk_text
+from services.chunking import file_sha256, pdf_page_count, parse_page_selection, iter_pages_from_pdf_path, PDF_PAGES_PER_TASK, IncrementalSplitter, chunk_text, chunk_text_by_tokens, estimate_tokens
 from pydantic import ValidationError
-from services.llm_service import query_llm  
-from fastapi import UploadFile
-import re
+from services.llm_service import query_llm, query_llm_stream, forget_response, get_loaded_context_length
+from services.json_extract import IncrementalCardParser, extract_card_objects
+from services.dedup import NearDuplicateIndex, dedup_cards
+from services.text_filter import BoilerplateStripper, ChunkFilter, format_skip_report
+from services.document_cache import (
+    DOCUMENT_CACHE_ENABLED, get_page_count, save_page_count, has_pages, iter_pages as iter_cached_pages, save_pages,
+    get_chunk_report, iter_chunks as iter_cached_chunks, ChunkSetWriter,
+)
+from services.concept_tree import parse_blueprint, select_concepts
+from services.checkpoints import CHECKPOINTS_ENABLED, make_run_key, make_document_run_key, load_checkpoints, save_checkpoint, clear_checkpoints
+from functools import partial
+from pathlib import Path
+from typing import AsyncIterator, Callable
+import asyncio
+import hashlib
 import json
+import os
 
-def extract_valid_json(text: str) -> list | dict:
-    matches = re.findall(r'\[\s*{[\s\S]*?}\s*]', text)
-    for match in matches:
-        try:
-            return json.loads(match)
-        except json.JSONDecodeError:
-            continue
-    raise ValueError("No valid JSON found in response.")
+# Número máximo de chunks enviados al modelo en paralelo. Con 1 se procesa
+# secuencialmente; súbelo hasta el número de slots paralelos del servidor.
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "1"))
+
+# Margen de tokens reservado al dimensionar chunks por contexto (plantilla de
+# chat, error de la estimación) y tamaño mínimo de chunk.
+CONTEXT_SAFETY_MARGIN = int(os.getenv("CONTEXT_SAFETY_MARGIN", "256"))
+MIN_CHUNK_TOKENS = int(os.getenv("MIN_CHUNK_TOKENS", "200"))
+
+def extract_valid_json(text: str) -> list:
+    cards = extract_card_objects(text)
+    if not cards:
+        raise ValueError("No valid JSON found in response.")
+    return cards
 
 
 def sanitize_flashcards(raw_cards):
@@ -38,11 +57,11 @@ def sanitize_flashcards(raw_cards):
 
     return sanitized
 
-async def generate_flashcards_from_chunk(
+def build_chunk_request(
     chunk: str,
     template: TemplateFields,
     prompt: PromptInstructions
-):
+) -> LLMRequest:
     system_prompt = prompt.system_prompt.strip()
 
     template_description = f"""
@@ -66,45 +85,592 @@ async def generate_flashcards_from_chunk(
     {template_description}
     """
 
-    llm_request  = LLMRequest(
+    return LLMRequest(
         temperature=prompt.temperature,
         max_tokens=prompt.max_tokens,
+        use_cache=prompt.use_cache,
         messages=[
             Message(role="system", content=system_prompt),
             Message(role="user", content=user_prompt),
         ]
     )
 
+
+async def stream_cards_from_request(llm_request: LLMRequest) -> list:
+    """
+    Consulta el modelo en streaming y extrae cada tarjeta en cuanto se cierra
+    su objeto JSON; la generación se corta al cerrarse el arreglo principal.
+    """
+    parser = IncrementalCardParser()
+
+    def on_delta(delta: str) -> bool:
+        parser.feed(delta)
+        return parser.closed
+
+    response: LLMResponse = await query_llm_stream(llm_request, on_delta)
+    print(f"Respuesta del modelo (stream): {response.response}")
+    if parser.cards:
+        return parser.cards
+    return extract_valid_json(response.response)
+
+
+async def generate_flashcards_from_chunk(
+    chunk: str,
+    template: TemplateFields,
+    prompt: PromptInstructions
+):
+    llm_request = build_chunk_request(chunk, template, prompt)
+
     response : LLMResponse = await query_llm(llm_request)
     print(f"Respuesta del modelo: {response.response}")
     return response.response
 
 
-async def process_deck_creation(
-    pdf_file: UploadFile,
+def build_packed_request(
+    chunks: list[str],
+    template: TemplateFields,
+    prompt: PromptInstructions
+) -> LLMRequest:
+    """
+    Empaqueta varios chunks etiquetados en una sola petición; cada tarjeta
+    devuelta debe indicar en "fragmento" el número del texto del que sale.
+    """
+    system_prompt = prompt.system_prompt.strip()
+
+    fragments = "\n".join(
+        f"[FRAGMENTO {n}]\n{chunk}\n[FIN FRAGMENTO {n}]"
+        for n, chunk in enumerate(chunks, start=1)
+    )
+
+    template_description = f"""
+    Genera AL MENOS UNA tarjeta en formato JSON para Anki a partir de CADA UNO de los {len(chunks)} fragmentos dados.
+
+    Devuelve UN ÚNICO arreglo JSON. Cada tarjeta debe ser un objeto JSON que contenga EXACTAMENTE los siguientes campos: 
+
+    - "fragmento": número del fragmento del que sale la tarjeta (entero de 1 a {len(chunks)})
+
+    - "campos_anverso": {template.front}
+
+    - "campo_reverso": {template.back}
+
+    IMPORTANTE:
+    - Cada elemento de las listas debe ser una cadena de texto (string).
+    - El contenido debe ser estrictamente un JSON válido. No agregues explicaciones ni comentarios fuera del JSON NUNCA.
+    - SOLO RETORNA EL JSON, sin ningún otro texto o explicación adicional.
+    """
+    user_prompt = f"""
+    TEXTOS EXTRAÍDOS:
+    {fragments}
+    INSTRUCCIONES:
+    {template_description}
+    """
+
+    return LLMRequest(
+        temperature=prompt.temperature,
+        max_tokens=prompt.max_tokens,
+        use_cache=prompt.use_cache,
+        messages=[
+            Message(role="system", content=system_prompt),
+            Message(role="user", content=user_prompt),
+        ]
+    )
+
+
+async def generate_flashcards_from_chunks(
+    chunks: list[str],
     template: TemplateFields,
     prompt: PromptInstructions
 ):
-    extracted_text = await extract_text_from_pdf(pdf_file)
-    if not extracted_text:
-        raise ValueError("No text extracted from PDF.")
+    llm_request = build_packed_request(chunks, template, prompt)
 
-    chunks = chunk_text(extracted_text)
-    if not chunks:
-        raise ValueError("No valid text chunks found.")
+    response : LLMResponse = await query_llm(llm_request)
+    print(f"Respuesta del modelo (empaquetada x{len(chunks)}): {response.response}")
+    return response.response
+
+
+def demux_packed_cards(parsed_cards, pack_len: int) -> list[list]:
+    """
+    Reparte las tarjetas de una respuesta empaquetada por fragmento. Lanza
+    ValueError si alguna tarjeta no indica un fragmento válido.
+    """
+    if not isinstance(parsed_cards, list):
+        raise ValueError("Packed response is not a JSON array.")
+
+    per_chunk = [[] for _ in range(pack_len)]
+    for card in parsed_cards:
+        if not isinstance(card, dict):
+            raise ValueError("Packed response contains a non-object card.")
+        card = dict(card)
+        try:
+            fragment = int(card.pop("fragmento"))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Packed card without a valid 'fragmento' tag.")
+        if not 1 <= fragment <= pack_len:
+            raise ValueError(f"Packed card tagged with unknown fragment {fragment}.")
+        per_chunk[fragment - 1].append(card)
+    return per_chunk
+
+
+def compute_chunk_token_budget(
+    context_length: int,
+    template: TemplateFields,
+    prompt: PromptInstructions
+) -> int:
+    """
+    Tokens disponibles para el texto de cada chunk: el contexto del modelo
+    menos el prompt fijo (sistema + instrucciones), los tokens de salida y un margen.
+    """
+    empty_request = build_chunk_request("", template, prompt)
+    prompt_tokens = sum(estimate_tokens(msg.content) for msg in empty_request.messages)
+    budget = context_length - prompt_tokens - prompt.max_tokens - CONTEXT_SAFETY_MARGIN
+    return max(MIN_CHUNK_TOKENS, budget)
+
+
+async def _enumerate_chunks(chunks: list[str] | AsyncIterator[str | tuple[int, str]]):
+    if isinstance(chunks, list):
+        for item in enumerate(chunks):
+            yield item
+        return
+    idx = 0
+    async for item in chunks:
+        # un iterador puede dar (idx, chunk) si los produce fuera de orden
+        if isinstance(item, tuple):
+            yield item
+            continue
+        yield idx, item
+        idx += 1
+
+
+async def iter_chunk_results(
+    chunks: list[str] | AsyncIterator[str],
+    template: TemplateFields,
+    prompt: PromptInstructions,
+    concurrency: int | None = None,
+    label: str = "chunk",
+    sanitize: bool = False,
+    pack_size: int = 1,
+    run_key: str | None = None,
+    slots: asyncio.Semaphore | None = None
+):
+    """
+    Genera las tarjetas de cada chunk con como máximo `concurrency` peticiones
+    simultáneas al modelo y produce `(idx, cards, error)` a medida que cada
+    chunk termina. Un chunk que falla produce `cards=[]` y el error, sin
+    afectar a los demás.
+
+    `chunks` puede ser una lista o un iterador asíncrono (ingesta en
+    streaming): los chunks se piden solo cuando hay un hueco libre para
+    procesarlos, así que la extracción avanza al ritmo del modelo.
+
+    Con `pack_size > 1` se envían hasta `pack_size` chunks por petición; si la
+    respuesta empaquetada no se puede repartir, esos chunks se reintentan uno a uno.
+
+    Cada chunk generado se guarda como checkpoint; al reintentar el mismo
+    documento con la misma plantilla y prompt solo se generan los que faltan.
+    Con un iterador, la clave del documento la da el llamador en `run_key`.
 
-    all_cards = []
-    for idx, chunk in enumerate(chunks):
-        print(f"Procesando chunk {idx + 1}/{len(chunks)}")
+    `slots` permite compartir el límite de peticiones con otra etapa que
+    también llama al modelo (p. ej. la expansión de conceptos); en ese caso
+    se ignora `concurrency`.
+    """
+    pack_size = max(1, pack_size)
+    if slots is None:
+        slots = asyncio.Semaphore(max(1, concurrency or LLM_CONCURRENCY))
+    total = len(chunks) if isinstance(chunks, list) else "?"
+
+    def finish(cards_raw):
+        return sanitize_flashcards(cards_raw) if sanitize else cards_raw
+
+    async def run_single(idx: int, chunk: str):
+        print(f"Procesando {label} {idx + 1}/{total}")
         try:
-            response_text = await generate_flashcards_from_chunk(chunk, template, prompt)
-            parsed_cards = extract_valid_json(response_text)
-            all_cards.extend(parsed_cards)
+            if prompt.stream:
+                parsed_cards = await stream_cards_from_request(build_chunk_request(chunk, template, prompt))
+            else:
+                response_text = await generate_flashcards_from_chunk(chunk, template, prompt)
+                parsed_cards = extract_valid_json(response_text)
+            return idx, finish(parsed_cards), None
         except Exception as e:
-            print(f"⚠️ Chunk {idx + 1} descartado por error: {e}")
-            continue  # ignorar el chunk y pasar al siguiente
+            print(f"⚠️ {label.capitalize()} {idx + 1} descartado por error: {e}")
+            await forget_response(build_chunk_request(chunk, template, prompt))
+            return idx, [], str(e)  # ignorar el chunk y seguir con los demás
+
+    async def run_group(group: list[tuple[int, str]]):
+        if len(group) == 1:
+            return [await run_single(*group[0])]
+
+        indices = [idx for idx, _ in group]
+        print(f"Procesando {label}s {indices[0] + 1}-{indices[-1] + 1}/{total} (empaquetados)")
+        group_chunks = [chunk for _, chunk in group]
+        try:
+            if prompt.stream:
+                parsed_cards = await stream_cards_from_request(build_packed_request(group_chunks, template, prompt))
+            else:
+                response_text = await generate_flashcards_from_chunks(group_chunks, template, prompt)
+                parsed_cards = extract_valid_json(response_text)
+            per_chunk = demux_packed_cards(parsed_cards, len(group))
+            return [(idx, finish(cards), None) for idx, cards in zip(indices, per_chunk)]
+        except Exception as e:
+            print(f"⚠️ Respuesta empaquetada inválida ({e}), reintentando {label}s por separado")
+            await forget_response(build_packed_request(group_chunks, template, prompt))
+            return [await run_single(idx, chunk) for idx, chunk in group]
+
+    # chunks ya generados en un intento anterior del mismo documento/plantilla/prompt
+    if not CHECKPOINTS_ENABLED:
+        run_key = None
+    elif run_key is None and isinstance(chunks, list):
+        run_key = make_run_key(
+            chunks,
+            template.model_dump_json(),
+            prompt.model_dump_json(include={"system_prompt", "temperature", "max_tokens"}),
+            label,
+        )
+    done = load_checkpoints(run_key) if run_key is not None else {}
+    if done:
+        print(f"Reanudando: {len(done)} {label}s ya generados")
+    for idx, cards in sorted(done.items()):
+        yield idx, (to_flashcards(cards) if sanitize else cards), None
+
+    finished: asyncio.Queue = asyncio.Queue()
+    tasks: set[asyncio.Task] = set()
+
+    def on_task_done(task: asyncio.Task):
+        slots.release()
+        tasks.discard(task)
+        finished.put_nowait(task)
+
+    async def launch(group: list[tuple[int, str]]):
+        await slots.acquire()  # no se lee el siguiente chunk hasta que hay hueco
+        task = asyncio.create_task(run_group(group))
+        tasks.add(task)
+        task.add_done_callback(on_task_done)
+
+    async def produce():
+        group = []
+        async for idx, chunk in _enumerate_chunks(chunks):
+            if idx in done:
+                continue
+            group.append((idx, chunk))
+            if len(group) == pack_size:
+                await launch(group)
+                group = []
+        if group:
+            await launch(group)
+
+    producer = asyncio.create_task(produce())
+    failed = 0
+    try:
+        while not (producer.done() and not tasks and finished.empty()):
+            if producer.done():
+                producer.result()  # propaga los errores de extracción
+                task = await finished.get()
+            else:
+                getter = asyncio.ensure_future(finished.get())
+                await asyncio.wait({getter, producer}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    continue
+                task = getter.result()
+            for idx, cards, error in task.result():
+                if error is not None:
+                    failed += 1
+                elif run_key is not None:
+                    save_checkpoint(run_key, idx, [c.model_dump() if isinstance(c, Flashcard) else c for c in cards])
+                yield idx, cards, error
+        producer.result()
+        if run_key is not None and failed == 0:
+            clear_checkpoints(run_key)  # documento completo: ya no hay nada que reanudar
+    finally:
+        # si el consumidor abandona (p. ej. el cliente se desconecta) no seguimos gastando el modelo
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+
+async def generate_cards_for_chunks(
+    chunks: list[str] | AsyncIterator[str],
+    template: TemplateFields,
+    prompt: PromptInstructions,
+    concurrency: int | None = None,
+    label: str = "chunk",
+    sanitize: bool = False,
+    pack_size: int = 1,
+    on_progress: Callable[[int, int, int], None] | None = None,
+    run_key: str | None = None,
+    total: int | None = None,
+    slots: asyncio.Semaphore | None = None
+) -> list[list]:
+    """
+    Devuelve una lista de tarjetas por chunk, en el orden original de los chunks.
+    Si se da `on_progress`, se llama con (completados, total, fallidos) tras cada
+    chunk; con un iterador el total es `total` o 0 hasta que se conoce al terminar.
+    """
+    results = {}
+    total = len(chunks) if isinstance(chunks, list) else (total or 0)
+    completed = 0
+    failed = 0
+    async for idx, cards, error in iter_chunk_results(
+        chunks, template, prompt, concurrency=concurrency, label=label, sanitize=sanitize,
+        pack_size=pack_size, run_key=run_key, slots=slots
+    ):
+        results[idx] = cards
+        completed += 1
+        if error is not None:
+            failed += 1
+        if on_progress is not None:
+            on_progress(completed, total, failed)
+    if on_progress is not None and not total:
+        on_progress(completed, completed, failed)
+    count = total or (max(results) + 1 if results else 0)
+    return [results.get(idx, []) for idx in range(count)]
+
+
+def to_flashcards(raw_cards) -> list[Flashcard]:
+    cards = []
+    for item in raw_cards:
+        if isinstance(item, Flashcard):
+            cards.append(item)
+            continue
+        try:
+            cards.append(Flashcard(**item))
+        except (ValidationError, TypeError):
+            continue
+    return cards
+
+
+def merge_chunk_cards(results: list[list], dedup: bool = True, dedup_threshold: float | None = None) -> list:
+    cards = [card for cards in results for card in cards]
+    return dedup_cards(cards, dedup_threshold) if dedup else cards
+
+
+async def resolve_splitter(
+    template: TemplateFields,
+    prompt: PromptInstructions,
+    chunking: str = "chars",
+    pack_size: int = 1
+) -> tuple[Callable[[str], list[str]], str]:
+    """
+    Elige cómo dividir el texto en chunks. En modo "tokens" el tamaño se ajusta
+    al contexto del modelo cargado (repartido entre los chunks de cada paquete);
+    si no se puede consultar, se usa el modo por caracteres. Devuelve la
+    función de corte y una descripción para la clave de los checkpoints.
+    """
+    if chunking == "tokens":
+        context_length = await get_loaded_context_length()
+        if context_length:
+            budget = compute_chunk_token_budget(context_length, template, prompt) // max(1, pack_size)
+            print(f"Chunking por tokens: contexto {context_length}, {budget} tokens por chunk")
+            return partial(chunk_text_by_tokens, max_tokens=budget), f"tokens:{budget}"
+        print("⚠️ No se pudo obtener el contexto del modelo, usando chunks por caracteres")
+    return chunk_text, "chars"
+
+
+def split_settings(split_spec: str, skip_boilerplate: bool, pages: str | None) -> str:
+    """Todo lo que, además del PDF, determina la lista de chunks."""
+    return json.dumps({"split": split_spec, "pages": pages, "skip_boilerplate": skip_boilerplate})
+
+
+def document_run_key(
+    document_id: str,
+    settings: str,
+    template: TemplateFields,
+    prompt: PromptInstructions
+) -> str:
+    return make_document_run_key(
+        document_id,
+        settings,
+        template.model_dump_json(),
+        prompt.model_dump_json(include={"system_prompt", "temperature", "max_tokens"}),
+        "chunk",
+    )
+
+
+async def iter_document_pages(pdf_path: str | Path, document_id: str | None, pages: str | None = None):
+    """
+    Texto de las páginas seleccionadas: de la caché de documentos si ya se
+    extrajeron todas; si no, del PDF, guardándolas en la caché por tandas.
+    """
+    caching = document_id is not None and DOCUMENT_CACHE_ENABLED
+    page_count = get_page_count(document_id) if caching else None
+    if page_count is None:
+        page_count = await pdf_page_count(pdf_path)
+        if caching:
+            save_page_count(document_id, page_count)
+    page_numbers = parse_page_selection(pages, page_count)
+
+    if caching and has_pages(document_id, page_numbers):
+        for text in iter_cached_pages(document_id, page_numbers):
+            yield text
+        return
+
+    batch = []
+    async for page_no, text in iter_pages_from_pdf_path(pdf_path, page_numbers):
+        if caching:
+            batch.append((page_no, text))
+            if len(batch) >= PDF_PAGES_PER_TASK:
+                save_pages(document_id, batch)
+                batch = []
+        yield text
+    if batch:
+        save_pages(document_id, batch)
+
+
+async def iter_pdf_chunks(
+    pdf_path: str | Path,
+    split: Callable[[str], list[str]],
+    settings: str,
+    skip_boilerplate: bool = True,
+    pages: str | None = None,
+    report: dict | None = None,
+    document_id: str | None = None
+):
+    """
+    Ingesta en streaming: páginas del PDF → filtro de encabezados/pies →
+    splitter incremental → filtro de chunks. Produce los chunks a medida que
+    se extraen las páginas; `report` se va rellenando con lo descartado.
+    Con `document_id`, una lista de chunks ya calculada con los mismos
+    `settings` se lee de la caché sin volver a extraer ni cortar.
+    """
+    caching = document_id is not None and DOCUMENT_CACHE_ENABLED
+    if caching and (cached_report := get_chunk_report(document_id, settings)) is not None:
+        print("Chunks del documento reutilizados de la caché")
+        if report is not None:
+            report.update(cached_report)
+        for chunk in iter_cached_chunks(document_id, settings):
+            yield chunk
+        return
+
+    writer = ChunkSetWriter(document_id, settings) if caching else None
+    stripper = BoilerplateStripper(report) if skip_boilerplate else None
+    chunk_filter = ChunkFilter(report) if skip_boilerplate else None
+    splitter = IncrementalSplitter(split)
+    produced = 0
+
+    def accepted(new_chunks: list[str]) -> list[str]:
+        if chunk_filter is not None:
+            new_chunks = [chunk for chunk in new_chunks if chunk_filter.accept(chunk)]
+        if writer is not None:
+            for chunk in new_chunks:
+                writer.add(chunk)
+        return new_chunks
+
+    def cleaned(page_texts: list[str]) -> list[str]:
+        return [chunk for text in page_texts if text.strip() for chunk in accepted(splitter.feed(text))]
+
+    async for page in iter_document_pages(pdf_path, document_id, pages):
+        for chunk in cleaned(stripper.feed(page) if stripper else [page]):
+            produced += 1
+            yield chunk
+
+    tail = cleaned(stripper.flush()) if stripper else []
+    for chunk in tail + accepted(splitter.flush()):
+        produced += 1
+        yield chunk
+
+    if skip_boilerplate:
+        print(f"Filtro previo: {format_skip_report(report or {})}")
+    if not produced:
+        raise ValueError("No valid text chunks found.")
+    if writer is not None:
+        writer.complete(report or {})
 
-    return all_cards
+
+async def process_deck_creation(
+    pdf_path: str | Path,
+    template: TemplateFields,
+    prompt: PromptInstructions,
+    concurrency: int | None = None,
+    chunking: str = "chars",
+    pack_size: int = 1,
+    dedup: bool = True,
+    dedup_threshold: float | None = None,
+    skip_boilerplate: bool = True,
+    pages: str | None = None,
+    document_id: str | None = None,
+    on_progress: Callable[[int, int, int], None] | None = None,
+    report: dict | None = None
+):
+    """
+    Genera las tarjetas de un PDF en disco: las primeras peticiones al modelo
+    salen mientras todavía se extraen las páginas siguientes. `document_id`
+    es el sha256 del PDF (se calcula si no se da). Si se da `report`, se
+    rellena con lo descartado por el filtro previo.
+    """
+    split, split_spec = await resolve_splitter(template, prompt, chunking, pack_size)
+    document_id = document_id or await asyncio.to_thread(file_sha256, pdf_path)
+    settings = split_settings(split_spec, skip_boilerplate, pages)
+    report = {} if report is None else report
+    results = await generate_cards_for_chunks(
+        iter_pdf_chunks(pdf_path, split, settings, skip_boilerplate, pages, report, document_id),
+        template, prompt, concurrency=concurrency, label="chunk", pack_size=pack_size,
+        on_progress=on_progress, run_key=document_run_key(document_id, settings, template, prompt)
+    )
+    return merge_chunk_cards(results, dedup, dedup_threshold)
+
+
+async def stream_deck_creation(
+    pdf_path: str | Path,
+    document_id: str,
+    template: TemplateFields,
+    prompt: PromptInstructions,
+    concurrency: int | None = None,
+    chunking: str = "chars",
+    pack_size: int = 1,
+    dedup: bool = True,
+    dedup_threshold: float | None = None,
+    skip_boilerplate: bool = True,
+    pages: str | None = None
+):
+    """
+    Variante en streaming de `process_deck_creation`: produce eventos
+    (dict) con las tarjetas de cada chunk en cuanto están listas. El total de
+    chunks no se conoce hasta el final (la extracción sigue en paralelo), así
+    que solo va en el evento "done", junto con el resumen de lo descartado.
+    """
+    report = {}
+    yield {"event": "start", "document_id": document_id}
+    index = NearDuplicateIndex(dedup_threshold) if dedup else None
+
+    completed = 0
+    failed = 0
+    total_cards = 0
+    try:
+        split, split_spec = await resolve_splitter(template, prompt, chunking, pack_size)
+        settings = split_settings(split_spec, skip_boilerplate, pages)
+        async for idx, raw_cards, error in iter_chunk_results(
+            iter_pdf_chunks(pdf_path, split, settings, skip_boilerplate, pages, report, document_id),
+            template, prompt, concurrency=concurrency, label="chunk", pack_size=pack_size,
+            run_key=document_run_key(document_id, settings, template, prompt)
+        ):
+            completed += 1
+            if error is not None:
+                failed += 1
+                yield {"event": "chunk_failed", "chunk": idx + 1, "completed": completed, "error": error}
+                continue
+
+            cards = to_flashcards(raw_cards)
+            if index is not None:
+                cards = [card for card in cards if index.add(card)]
+            total_cards += len(cards)
+            yield {
+                "event": "cards",
+                "chunk": idx + 1,
+                "completed": completed,
+                "cards": [card.model_dump() for card in cards],
+            }
+    except Exception as e:
+        # p. ej. un PDF corrupto: el cliente recibe siempre un evento final
+        yield {"event": "error", "error": str(e)}
+        return
+
+    yield {
+        "event": "done",
+        "total_chunks": completed,
+        "failed_chunks": failed,
+        "total_cards": total_cards,
+        "duplicates_removed": index.duplicates if index is not None else 0,
+        "skipped": report,
+    }
 
 
 async def build_topic_blueprint(topic : str , prompt : PromptInstructions) -> str:
@@ -125,6 +691,7 @@ No incluyas explicaciones, solo el esquema en texto, estructurado para que luego
     llm_request = LLMRequest(
         temperature=prompt.temperature,
         max_tokens=prompt.max_tokens,
+        use_cache=prompt.use_cache,
         messages=[
             Message(role="system", content=prompt.system_prompt.strip()),
             Message(role="user", content=user_prompt),
@@ -159,6 +726,7 @@ async def flesh_out_concept( topic: str, prompt: PromptInstructions):
     llm_request = LLMRequest(
         temperature=prompt.temperature,
         max_tokens=prompt.max_tokens,
+        use_cache=prompt.use_cache,
         messages=[
             Message(role="system", content=prompt.system_prompt.strip()),
             Message(role="user", content=user_prompt.strip()),
@@ -169,28 +737,151 @@ async def flesh_out_concept( topic: str, prompt: PromptInstructions):
 
     return response.response
 
+async def iter_expanded_concepts(
+    concepts: list[str],
+    prompt: PromptInstructions,
+    concurrency: int | None = None,
+    priorities: list[int] | None = None,
+    deadline: float | None = None,
+    slots: asyncio.Semaphore | None = None
+):
+    """
+    Expande los conceptos con como máximo `concurrency` peticiones a la vez y
+    produce `(idx, expansión)` en cuanto cada una termina, para que la
+    generación de tarjetas de ese concepto empiece sin esperar al resto.
+
+    Las peticiones se lanzan por `priorities` (menor primero). Pasado
+    `deadline` (hora del bucle de eventos) no se empieza ninguna expansión
+    nueva; las que ya estaban en curso terminan normalmente.
+
+    Con `slots` el límite se comparte con la generación de tarjetas.
+    """
+    semaphore = slots or asyncio.Semaphore(max(1, concurrency or LLM_CONCURRENCY))
+    loop = asyncio.get_running_loop()
+    order = sorted(range(len(concepts)), key=lambda i: priorities[i]) if priorities else range(len(concepts))
+
+    async def expand(idx: int, concept: str):
+        async with semaphore:
+            if deadline is not None and loop.time() >= deadline:
+                print(f"Límite de tiempo alcanzado: se omite el concepto {idx+1}")
+                return idx, ""
+            try:
+                return idx, (await flesh_out_concept(concept, prompt)).strip()
+            except Exception as e:
+                raise RuntimeError(f"Error al expandir el concepto {idx+1}: {str(e)}")
+
+    # el semáforo atiende por orden de llegada, así que se crean por prioridad
+    tasks = [asyncio.create_task(expand(idx, concepts[idx])) for idx in order]
+    expanded = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            idx, expansion = await next_done
+            if expansion:
+                expanded += 1
+                yield idx, expansion
+        if not expanded:
+            raise ValueError("No se generaron conceptos expandidos a partir del tema proporcionado.")
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
 async def process_deck_creation_topic(
-    chunks: list[str],
+    chunks: list[str] | AsyncIterator[tuple[int, str]],
     template: TemplateFields,
-    prompt: PromptInstructions
+    prompt: PromptInstructions,
+    concurrency: int | None = None,
+    dedup: bool = True,
+    dedup_threshold: float | None = None,
+    on_progress: Callable[[int, int, int], None] | None = None,
+    run_key: str | None = None,
+    total: int | None = None,
+    slots: asyncio.Semaphore | None = None
 ):
-    if not chunks:
+    if isinstance(chunks, list) and not chunks:
         raise ValueError("No valid text chunks found.")
 
-    all_cards = []
-    for idx, chunk in enumerate(chunks):
-        print(f"Procesando concepto {idx + 1}/{len(chunks)}")
-        try:
-            response_text = await generate_flashcards_from_chunk(chunk, template, prompt)
-            parsed_cards = extract_valid_json(response_text)
-            
-            cards = sanitize_flashcards(parsed_cards)
+    results = await generate_cards_for_chunks(
+        chunks, template, prompt, concurrency=concurrency, label="concepto", sanitize=True,
+        on_progress=on_progress, run_key=run_key, total=total, slots=slots
+    )
+    return merge_chunk_cards(results, dedup, dedup_threshold)
 
-            all_cards.extend(cards)
 
-        except Exception as e:
-            print(f"⚠️ Concepto {idx + 1} descartado por error: {e}")
-            continue  # ignorar el concepto y pasar al siguiente
+async def create_topic_flashcards(
+    request: TopicDeckRequest,
+    on_progress: Callable[[int, int, int], None] | None = None
+):
+    """
+    Pipeline completo tema -> esquema -> conceptos expandidos -> tarjetas.
+    Las expansiones y las tarjetas comparten el límite de `request.concurrency`
+    peticiones simultáneas; cada expansión pasa a generar tarjetas en cuanto
+    está lista.
+
+    El esquema se convierte en un árbol de conceptos. Se expanden los
+    CONCEPT_MAX_DEPTH niveles superiores y, con presupuesto (`max_concepts`,
+    `max_llm_calls`, `time_limit_seconds`), solo los de nivel más alto; el
+    resto se resume dentro de su antecesor.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + request.time_limit_seconds if request.time_limit_seconds else None
+
+    # una llamada para el esquema y dos por concepto (expansión y tarjetas)
+    max_concepts = request.max_concepts
+    if request.max_llm_calls is not None:
+        by_calls = (request.max_llm_calls - 1) // 2
+        if by_calls < 1:
+            raise ValueError("max_llm_calls debe permitir al menos 3 llamadas (esquema, expansión y tarjetas).")
+        max_concepts = min(max_concepts, by_calls) if max_concepts else by_calls
+
+    blueprint_prompt = PromptInstructions(
+        system_prompt= "Actúa como un experto académico. Tu tarea es generar un esquema maestro con los fundamentos esenciales,  estructuras y temas clave que constituyen el núcleo del tópico proporcionado. Sé riguroso, preciso y exhaustivo.",
+        temperature= 0.3,
+        max_tokens=512,
+        use_cache=request.prompt.use_cache
+    )  
+
+    blueprint_text = await build_topic_blueprint(request.topic, blueprint_prompt)
+    selected = select_concepts(parse_blueprint(blueprint_text), max_concepts)
+    if not selected:
+        raise ValueError("No se generaron conceptos a partir del tema proporcionado.")
+    chunks = [concept for concept, _ in selected]
+    print(f"Conceptos seleccionados: {len(chunks)}" + (f" (máximo {max_concepts})" if max_concepts else ""))
+
+    flesh_out_prompt= PromptInstructions(
+        system_prompt= "Desarrolla en profundidad el siguiente concepto clave como si estuvieras escribiendo un capítulo académico. Explícalo con claridad, detalle y precisión, de forma estructurada y comprensible para estudiantes avanzados.",
+        temperature= 0.4,
+        max_tokens= 512,
+        use_cache=request.prompt.use_cache
+    )
 
-    return all_cards
-    
+    # los conceptos llegan fuera de orden, así que el checkpoint se asocia a la selección
+    run_key = make_document_run_key(
+        hashlib.sha256("\n".join(chunks).encode("utf-8")).hexdigest(),
+        flesh_out_prompt.model_dump_json(include={"system_prompt", "temperature", "max_tokens"}),
+        request.template.model_dump_json(),
+        request.prompt.model_dump_json(include={"system_prompt", "temperature", "max_tokens"}),
+        "concepto",
+    )
+
+    # un solo límite para las dos etapas, que se solapan
+    slots = asyncio.Semaphore(max(1, request.concurrency or LLM_CONCURRENCY))
+    try:
+        return await process_deck_creation_topic(
+            chunks=iter_expanded_concepts(
+                chunks, flesh_out_prompt, request.concurrency,
+                priorities=[priority for _, priority in selected], deadline=deadline, slots=slots
+            ),
+            template=request.template,
+            prompt=request.prompt,
+            concurrency=request.concurrency,
+            dedup=request.dedup,
+            dedup_threshold=request.dedup_threshold,
+            on_progress=on_progress,
+            run_key=run_key,
+            total=len(chunks),
+            slots=slots)
+    except (ValueError, RuntimeError):
+        raise
+    except Exception as e:
+        raise RuntimeError(f"Error al procesar la creación del mazo: {str(e)}")
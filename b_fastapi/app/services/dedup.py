@@ -0,0 +1,116 @@
+import os
+import string
+
+# Eliminación de tarjetas casi duplicadas con MinHash (una permutación, K
+# bins) + LSH por bandas: cada tarjeta solo se compara con las que comparten
+# alguna banda, así que el coste es casi lineal en el número de tarjetas.
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+
+MINHASH_BINS = 32  # potencia de 2
+LSH_BANDS = 8
+_ROWS = MINHASH_BINS // LSH_BANDS
+_EMPTY = 1 << 64  # mayor que cualquier hash()
+_EMPTY_BAND = (_EMPTY,) * _ROWS
+
+# minúsculas sin tildes y la puntuación como separador de palabras
+_NORMALIZE = str.maketrans(
+    "áàäâãéèëêíìïîóòöôõúùüûñç" + string.punctuation + "¿¡«»",
+    "aaaaaeeeeiiiiooooouuuunc" + " " * (len(string.punctuation) + 4),
+)
+
+def _card_fields(card) -> tuple[list, list]:
+    if isinstance(card, dict):
+        front = card.get("campos_anverso", [])
+        back = card.get("campo_reverso", [])
+    else:
+        front = getattr(card, "campos_anverso", [])
+        back = getattr(card, "campo_reverso", [])
+    if isinstance(front, str):
+        front = [front]
+    if isinstance(back, str):
+        back = [back]
+    return front, back
+
+def normalize_card_text(card) -> str:
+    front, back = _card_fields(card)
+    return " ".join(map(str, [*front, *back])).lower().translate(_NORMALIZE)
+
+def _shingles(text: str):
+    # los repetidos no importan: el mínimo de cada bin es el mismo
+    words = text.split()
+    if len(words) < 2:
+        return words
+    return zip(words, words[1:])
+
+def minhash_signature(text: str) -> tuple[int, ...]:
+    # hash() es estable dentro del proceso, que es todo lo que necesita el índice
+    bins = [_EMPTY] * MINHASH_BINS
+    mask = MINHASH_BINS - 1
+    for h in map(hash, _shingles(text)):
+        b = h & mask
+        if h < bins[b]:
+            bins[b] = h
+    return tuple(bins)
+
+def signature_similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    """Estimación de Jaccard ignorando los bins vacíos en ambas firmas."""
+    matches = 0
+    used = 0
+    for x, y in zip(a, b):
+        if x == _EMPTY and y == _EMPTY:
+            continue
+        used += 1
+        if x == y:
+            matches += 1
+    return matches / used if used else 1.0
+
+class NearDuplicateIndex:
+    """
+    Índice incremental: `add(card)` devuelve False si la tarjeta es casi
+    idéntica (similitud >= threshold) a una ya vista.
+    """
+
+    def __init__(self, threshold: float | None = None):
+        self.threshold = DEDUP_THRESHOLD if threshold is None else threshold
+        self._exact: set[str] = set()
+        self._signatures: list[tuple[int, ...]] = []
+        self._buckets: list[dict[tuple, list[int]]] = [{} for _ in range(LSH_BANDS)]
+        self.duplicates = 0
+
+    def add(self, card) -> bool:
+        text = normalize_card_text(card)
+        if text in self._exact:
+            self.duplicates += 1
+            return False
+
+        signature = minhash_signature(text)
+        keys = list(zip(*[iter(signature)] * _ROWS))  # LSH_BANDS bandas de _ROWS bins
+        checked = set()
+        for bucket, key in zip(self._buckets, keys):
+            # una banda sin ningún shingle no dice nada: se ignora para no
+            # juntar todas las tarjetas cortas en el mismo bucket
+            if key == _EMPTY_BAND:
+                continue
+            for other in bucket.get(key, ()):
+                if other in checked:
+                    continue
+                checked.add(other)
+                if signature_similarity(signature, self._signatures[other]) >= self.threshold:
+                    self.duplicates += 1
+                    return False
+
+        position = len(self._signatures)
+        self._signatures.append(signature)
+        self._exact.add(text)
+        for bucket, key in zip(self._buckets, keys):
+            if key != _EMPTY_BAND:
+                bucket.setdefault(key, []).append(position)
+        return True
+
+def dedup_cards(cards: list, threshold: float | None = None) -> list:
+    """Conserva la primera aparición de cada grupo de tarjetas casi idénticas."""
+    index = NearDuplicateIndex(threshold)
+    kept = [card for card in cards if index.add(card)]
+    if index.duplicates:
+        print(f"Deduplicación: {index.duplicates} tarjetas casi duplicadas eliminadas de {len(cards)}")
+    return kept
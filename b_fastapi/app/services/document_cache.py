@@ -0,0 +1,281 @@
+from pathlib import Path
+from fastapi import UploadFile
+from services.chunking import spool_upload
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+
+# Caché de documentos por hash del PDF: el PDF, el texto de cada página y
+# las listas de chunks ya calculadas para cada forma de cortar. El hash sirve
+# de document_id para volver a generar sin subir el archivo otra vez.
+DOCUMENT_CACHE_ENABLED = os.getenv("DOCUMENT_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+DOCUMENT_CACHE_DIR = Path(os.getenv("DOCUMENT_CACHE_DIR", "/app/cache"))
+DOCUMENT_CACHE_MAX_BYTES = int(os.getenv("DOCUMENT_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+_DOCUMENT_ID = re.compile(r"^[0-9a-f]{64}$")
+_CHUNK_BATCH = 64
+
+_lock = threading.Lock()
+_conn: sqlite3.Connection | None = None
+# documentos que alguna petición o job está leyendo: la evicción no los toca
+_in_use: dict[str, int] = {}
+
+def _get_conn() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        DOCUMENT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(DOCUMENT_CACHE_DIR / "documents.sqlite", check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_id TEXT PRIMARY KEY,
+                page_count INTEGER,
+                size INTEGER NOT NULL DEFAULT 0,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                doc_id TEXT NOT NULL,
+                page_no INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (doc_id, page_no)
+            );
+            CREATE TABLE IF NOT EXISTS chunk_sets (
+                doc_id TEXT NOT NULL,
+                settings TEXT NOT NULL,
+                complete INTEGER NOT NULL DEFAULT 0,
+                report TEXT,
+                PRIMARY KEY (doc_id, settings)
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                doc_id TEXT NOT NULL,
+                settings TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (doc_id, settings, idx)
+            );
+            CREATE INDEX IF NOT EXISTS idx_documents_access ON documents(last_access);
+        """)
+        _conn.commit()
+    return _conn
+
+def _pdf_path(doc_id: str) -> Path:
+    return DOCUMENT_CACHE_DIR / "documents" / f"{doc_id}.pdf"
+
+def _touch(conn: sqlite3.Connection, doc_id: str, added_bytes: int = 0):
+    conn.execute(
+        """
+        INSERT INTO documents (doc_id, size, last_access) VALUES (?, ?, ?)
+        ON CONFLICT(doc_id) DO UPDATE SET size = size + excluded.size, last_access = excluded.last_access
+        """,
+        (doc_id, added_bytes, time.time()),
+    )
+
+def _evict(conn: sqlite3.Connection, keep: str):
+    # LRU por documento completo (PDF, páginas y chunks), sin tocar el que está en uso
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM documents").fetchone()[0]
+    if total <= DOCUMENT_CACHE_MAX_BYTES:
+        return
+    rows = conn.execute("SELECT doc_id, size FROM documents WHERE doc_id != ? ORDER BY last_access ASC", (keep,)).fetchall()
+    for doc_id, size in rows:
+        if total <= DOCUMENT_CACHE_MAX_BYTES:
+            break
+        if doc_id in _in_use:
+            continue
+        for table in ("documents", "pages", "chunk_sets", "chunks"):
+            conn.execute(f"DELETE FROM {table} WHERE doc_id = ?", (doc_id,))
+        _pdf_path(doc_id).unlink(missing_ok=True)
+        total -= size
+
+def _retain(doc_id: str):
+    _in_use[doc_id] = _in_use.get(doc_id, 0) + 1
+
+def release_document(doc_id: str):
+    """Libera un documento reservado por `open_document` o `retain_document`."""
+    with _lock:
+        count = _in_use.get(doc_id, 0) - 1
+        if count > 0:
+            _in_use[doc_id] = count
+        else:
+            _in_use.pop(doc_id, None)
+
+def retain_document(doc_id: str) -> Path | None:
+    """Reserva un documento de la caché (p. ej. para un job) y devuelve su PDF."""
+    if not (DOCUMENT_CACHE_ENABLED and _DOCUMENT_ID.match(doc_id or "")):
+        return None
+    target = _pdf_path(doc_id)
+    with _lock:
+        if not target.exists():
+            return None
+        conn = _get_conn()
+        _touch(conn, doc_id)
+        conn.commit()
+        _retain(doc_id)
+    return target
+
+async def open_document(pdf_file: UploadFile | None, document_id: str | None) -> tuple[Path, str, bool]:
+    """
+    Devuelve (ruta del PDF, document_id, es_temporal). Un PDF subido se guarda
+    en la caché; sin archivo se usa el de un `document_id` subido antes. Si la
+    ruta es temporal (caché desactivada), el llamador debe borrarla; si no, el
+    documento queda reservado hasta llamar a `release_document`.
+    """
+    if pdf_file is None and not document_id:
+        raise ValueError("Send a pdf_file or the document_id of a PDF uploaded before.")
+    if pdf_file is not None:
+        spooled, doc_id = await spool_upload(pdf_file)
+        if not DOCUMENT_CACHE_ENABLED:
+            return spooled, doc_id, True
+        target = _pdf_path(doc_id)
+        with _lock:
+            conn = _get_conn()
+            if target.exists():
+                spooled.unlink(missing_ok=True)
+                _touch(conn, doc_id)
+            else:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                size = spooled.stat().st_size
+                shutil.move(spooled, target)
+                _touch(conn, doc_id, size)
+                _evict(conn, keep=doc_id)
+            conn.commit()
+            _retain(doc_id)
+        return target, doc_id, False
+
+    target = retain_document(document_id)
+    if target is not None:
+        return target, document_id, False
+    raise LookupError("Unknown document_id: upload the PDF again.")
+
+def get_cached_pdf(document_id: str) -> Path | None:
+    target = _pdf_path(document_id)
+    return target if DOCUMENT_CACHE_ENABLED and target.exists() else None
+
+def get_page_count(doc_id: str) -> int | None:
+    with _lock:
+        row = _get_conn().execute("SELECT page_count FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+    return row[0] if row else None
+
+def save_page_count(doc_id: str, page_count: int):
+    with _lock:
+        conn = _get_conn()
+        _touch(conn, doc_id)
+        conn.execute("UPDATE documents SET page_count = ? WHERE doc_id = ?", (page_count, doc_id))
+        conn.commit()
+
+def has_pages(doc_id: str, page_numbers: list[int]) -> bool:
+    found = 0
+    with _lock:
+        conn = _get_conn()
+        for start in range(0, len(page_numbers), 500):
+            batch = page_numbers[start:start + 500]
+            marks = ",".join("?" * len(batch))
+            found += conn.execute(
+                f"SELECT COUNT(*) FROM pages WHERE doc_id = ? AND page_no IN ({marks})", (doc_id, *batch)
+            ).fetchone()[0]
+    return found == len(page_numbers)
+
+def iter_pages(doc_id: str, page_numbers: list[int]):
+    for start in range(0, len(page_numbers), _CHUNK_BATCH):
+        batch = page_numbers[start:start + _CHUNK_BATCH]
+        marks = ",".join("?" * len(batch))
+        with _lock:
+            texts = dict(_get_conn().execute(
+                f"SELECT page_no, text FROM pages WHERE doc_id = ? AND page_no IN ({marks})", (doc_id, *batch)
+            ).fetchall())
+        for n in batch:
+            yield texts[n]
+
+def save_pages(doc_id: str, pages: list[tuple[int, str]]):
+    with _lock:
+        conn = _get_conn()
+        size = 0
+        for n, text in pages:
+            # solo cuentan las páginas nuevas; las que ya estaban se ignoran
+            cursor = conn.execute("INSERT OR IGNORE INTO pages (doc_id, page_no, text) VALUES (?, ?, ?)", (doc_id, n, text))
+            if cursor.rowcount:
+                size += len(text.encode("utf-8"))
+        _touch(conn, doc_id, size)
+        _evict(conn, keep=doc_id)
+        conn.commit()
+
+def get_chunk_report(doc_id: str, settings: str) -> dict | None:
+    """Resumen del filtro si la lista de chunks para `settings` está completa."""
+    with _lock:
+        row = _get_conn().execute(
+            "SELECT report FROM chunk_sets WHERE doc_id = ? AND settings = ? AND complete = 1", (doc_id, settings)
+        ).fetchone()
+    return json.loads(row[0] or "{}") if row else None
+
+def iter_chunks(doc_id: str, settings: str):
+    # por tandas, para no cargar la lista entera en memoria
+    idx = 0
+    while True:
+        with _lock:
+            rows = _get_conn().execute(
+                "SELECT text FROM chunks WHERE doc_id = ? AND settings = ? AND idx >= ? ORDER BY idx LIMIT ?",
+                (doc_id, settings, idx, _CHUNK_BATCH),
+            ).fetchall()
+        if not rows:
+            return
+        for (text,) in rows:
+            yield text
+        idx += len(rows)
+
+class ChunkSetWriter:
+    """Guarda por tandas los chunks de una ejecución y marca la lista completa al final."""
+
+    def __init__(self, doc_id: str, settings: str):
+        self.doc_id = doc_id
+        self.settings = settings
+        self._pending: list[tuple[int, str]] = []
+        self._count = 0
+        with _lock:
+            conn = _get_conn()
+            stale = conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(CAST(text AS BLOB))), 0) FROM chunks WHERE doc_id = ? AND settings = ?",
+                (doc_id, settings),
+            ).fetchone()[0]
+            conn.execute("DELETE FROM chunks WHERE doc_id = ? AND settings = ?", (doc_id, settings))
+            _touch(conn, doc_id, -stale)
+            conn.execute("INSERT OR REPLACE INTO chunk_sets (doc_id, settings, complete) VALUES (?, ?, 0)", (doc_id, settings))
+            conn.commit()
+
+    def add(self, chunk: str):
+        self._pending.append((self._count, chunk))
+        self._count += 1
+        if len(self._pending) >= _CHUNK_BATCH:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        with _lock:
+            conn = _get_conn()
+            size = 0
+            for idx, text in self._pending:
+                # otra ejecución con los mismos ajustes pudo escribir ya este chunk
+                old = conn.execute(
+                    "SELECT LENGTH(CAST(text AS BLOB)) FROM chunks WHERE doc_id = ? AND settings = ? AND idx = ?",
+                    (self.doc_id, self.settings, idx),
+                ).fetchone()
+                conn.execute("INSERT OR REPLACE INTO chunks (doc_id, settings, idx, text) VALUES (?, ?, ?, ?)",
+                             (self.doc_id, self.settings, idx, text))
+                size += len(text.encode("utf-8")) - (old[0] if old else 0)
+            _touch(conn, self.doc_id, size)
+            conn.commit()
+        self._pending = []
+
+    def complete(self, report: dict):
+        self._flush()
+        with _lock:
+            conn = _get_conn()
+            conn.execute(
+                "UPDATE chunk_sets SET complete = 1, report = ? WHERE doc_id = ? AND settings = ?",
+                (json.dumps(report), self.doc_id, self.settings),
+            )
+            _evict(conn, keep=self.doc_id)
+            conn.commit()
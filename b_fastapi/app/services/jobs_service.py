@@ -0,0 +1,221 @@
+from pathlib import Path
+from schemas.decks_schema import CreateDeckRequest, TopicDeckRequest, Flashcard
+from services.decks_service import process_deck_creation, create_topic_flashcards, to_flashcards
+from services.document_cache import open_document, retain_document, release_document, get_cached_pdf
+from fastapi import UploadFile
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+# Jobs de generación de mazos en segundo plano. El estado vive en SQLite
+# (y el PDF subido junto a él) para sobrevivir a un reinicio del contenedor.
+JOBS_DIR = Path(os.getenv("JOBS_DIR", "/app/jobs"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+_lock = threading.Lock()
+_conn: sqlite3.Connection | None = None
+_queue: asyncio.Queue | None = None
+_workers: list[asyncio.Task] = []
+
+def _get_conn() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        JOBS_DIR.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(JOBS_DIR / "jobs.sqlite", check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                request TEXT NOT NULL,
+                progress_done INTEGER NOT NULL DEFAULT 0,
+                progress_total INTEGER NOT NULL DEFAULT 0,
+                failed_chunks INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                result TEXT,
+                skipped TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        # bases creadas antes de guardar el informe del filtro previo
+        columns = {row[1] for row in _conn.execute("PRAGMA table_info(jobs)")}
+        if "skipped" not in columns:
+            _conn.execute("ALTER TABLE jobs ADD COLUMN skipped TEXT")
+        _conn.commit()
+    return _conn
+
+def _update_job(job_id: str, **fields):
+    fields["updated_at"] = time.time()
+    columns = ", ".join(f"{name} = ?" for name in fields)
+    with _lock:
+        conn = _get_conn()
+        conn.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+        conn.commit()
+
+def _insert_job(kind: str, request_json: str) -> str:
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with _lock:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT INTO jobs (job_id, kind, status, request, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+            (job_id, kind, request_json, now, now),
+        )
+        conn.commit()
+    return job_id
+
+def _pdf_path(job_id: str) -> Path:
+    return JOBS_DIR / f"{job_id}.pdf"
+
+async def submit_pdf_job(request: CreateDeckRequest, pdf_file: UploadFile | None) -> tuple[str, str | None]:
+    """
+    Encola un job a partir del PDF subido o de un `document_id` que siga en
+    la caché de documentos. El job usa la copia de la caché, reservada hasta
+    que termina; solo con la caché desactivada guarda una copia propia.
+    Devuelve (job_id, document_id), sin document_id si no se puede reutilizar.
+    """
+    pdf_path, document_id, temporary = await open_document(pdf_file, request.document_id)
+    if temporary:
+        JOBS_DIR.mkdir(parents=True, exist_ok=True)
+        request = request.model_copy(update={"document_id": None})
+        job_id = _insert_job("pdf", request.model_dump_json())
+        shutil.move(pdf_path, _pdf_path(job_id))
+        _enqueue(job_id)
+        return job_id, None
+
+    request = request.model_copy(update={"document_id": document_id})
+    try:
+        job_id = _insert_job("pdf", request.model_dump_json())
+    except BaseException:
+        release_document(document_id)
+        raise
+    _enqueue(job_id)
+    return job_id, document_id
+
+def _retain_job_document(job_id: str):
+    with _lock:
+        row = _get_conn().execute("SELECT kind, request FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    if row is None or row[0] != "pdf" or _pdf_path(job_id).exists():
+        return
+    document_id = json.loads(row[1]).get("document_id")
+    if document_id:
+        retain_document(document_id)
+
+def submit_topic_job(request: TopicDeckRequest) -> str:
+    job_id = _insert_job("topic", request.model_dump_json())
+    _enqueue(job_id)
+    return job_id
+
+def _enqueue(job_id: str):
+    if _queue is not None:
+        _queue.put_nowait(job_id)
+
+_STATUS_COLUMNS = "job_id, kind, status, progress_done, progress_total, failed_chunks, error, skipped, created_at, updated_at"
+
+def get_job(job_id: str) -> dict | None:
+    with _lock:
+        row = _get_conn().execute(f"SELECT {_STATUS_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(zip([c.strip() for c in _STATUS_COLUMNS.split(",")], row))
+    job["skipped"] = json.loads(job["skipped"]) if job["skipped"] else None
+    return job
+
+def get_job_result(job_id: str) -> list[Flashcard] | None:
+    with _lock:
+        row = _get_conn().execute("SELECT result FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    if row is None or row[0] is None:
+        return None
+    return to_flashcards(json.loads(row[0]))
+
+async def _run_job(job_id: str):
+    with _lock:
+        row = _get_conn().execute("SELECT kind, request FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    if row is None:
+        return
+    kind, request_json = row
+    _update_job(job_id, status="running", error=None)
+
+    def on_progress(done: int, total: int, failed: int):
+        _update_job(job_id, progress_done=done, progress_total=total, failed_chunks=failed)
+
+    shared_document = None
+    report = {}
+    try:
+        if kind == "pdf":
+            request = CreateDeckRequest.model_validate_json(request_json)
+            pdf_path = _pdf_path(job_id)
+            if not pdf_path.exists():
+                pdf_path = get_cached_pdf(request.document_id or "")
+                if pdf_path is None:
+                    raise RuntimeError("El PDF del documento ya no está en la caché.")
+                shared_document = request.document_id
+            cards = await process_deck_creation(
+                pdf_path,
+                template=request.template,
+                prompt=request.prompt,
+                concurrency=request.concurrency,
+                chunking=request.chunking,
+                pack_size=request.pack_size,
+                dedup=request.dedup,
+                dedup_threshold=request.dedup_threshold,
+                skip_boilerplate=request.skip_boilerplate,
+                pages=request.pages,
+                document_id=request.document_id,
+                on_progress=on_progress,
+                report=report,
+            )
+        else:
+            request = TopicDeckRequest.model_validate_json(request_json)
+            cards = await create_topic_flashcards(request, on_progress=on_progress)
+
+        result = [card.model_dump() for card in to_flashcards(cards)]
+        _update_job(
+            job_id, status="completed", result=json.dumps(result, ensure_ascii=False),
+            skipped=json.dumps(report) if kind == "pdf" else None
+        )
+        _pdf_path(job_id).unlink(missing_ok=True)
+    except Exception as e:
+        print(f"[ERROR] Job {job_id} falló: {e}")
+        _update_job(job_id, status="failed", error=str(e), skipped=json.dumps(report) if report else None)
+        _pdf_path(job_id).unlink(missing_ok=True)
+    finally:
+        # la reserva se hizo al encolar (o al reencolar tras un reinicio); la
+        # copia propia del PDF se conserva si el job se cancela al apagar
+        if shared_document is not None:
+            release_document(shared_document)
+
+async def _worker():
+    while True:
+        job_id = await _queue.get()
+        try:
+            await _run_job(job_id)
+        finally:
+            _queue.task_done()
+
+def start_job_workers():
+    global _queue
+    _queue = asyncio.Queue()
+    # los jobs que quedaron a medias por un reinicio se vuelven a encolar
+    with _lock:
+        pending = _get_conn().execute(
+            "SELECT job_id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+        ).fetchall()
+    for (job_id,) in pending:
+        _retain_job_document(job_id)
+        _queue.put_nowait(job_id)
+    for _ in range(max(1, JOB_WORKERS)):
+        _workers.append(asyncio.create_task(_worker()))
+
+async def stop_job_workers():
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
@@ -0,0 +1,244 @@
+import json
+import re
+
+# Caracteres que cambian el estado del escáner dentro de un objeto / de un string
+_STRUCTURAL = re.compile(r'["{}\[\]]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+class IncrementalCardParser:
+    """
+    Escáner de una sola pasada de un arreglo JSON de tarjetas que puede llegar
+    por fragmentos.
+
+    `feed()` devuelve los objetos del arreglo de primer nivel cuyo `}` de
+    cierre ya llegó; `closed` pasa a True cuando se cierra un arreglo con
+    tarjetas, momento en el que se puede cortar la generación del modelo.
+    Los objetos mal formados se descartan sin perder los demás, y un arreglo
+    truncado conserva las tarjetas completas que llegaron.
+    """
+
+    def __init__(self):
+        self.cards: list[dict] = []
+        self.closed = False
+        self._state = "search"  # search -> open -> array -> object
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._buffer: list[str] = []
+
+    def feed(self, text: str) -> list[dict]:
+        new_cards = []
+        i = 0
+        n = len(text)
+        while i < n and not self.closed:
+            state = self._state
+            if state == "object":
+                i = self._scan_object(text, i, new_cards)
+            elif state == "search":
+                j = text.find("[", i)
+                if j < 0:
+                    break
+                self._state = "open"
+                i = j + 1
+            else:
+                ch = text[i]
+                i += 1
+                if ch.isspace() or (ch == "," and state == "array"):
+                    continue
+                if ch == "{":
+                    self._start_object()
+                elif ch == "]":
+                    self._close_array(new_cards)
+                elif ch == "[" and state == "open":
+                    continue  # "[[" : el candidato pasa a ser el último "["
+                else:
+                    # un "[" solo cuenta como inicio si le sigue un objeto
+                    self._state = "search"
+        self.cards.extend(new_cards)
+        return new_cards
+
+    def _scan_object(self, text: str, i: int, new_cards: list) -> int:
+        n = len(text)
+        buffer = self._buffer
+        while i < n:
+            if self._escape:
+                self._escape = False
+                buffer.append(text[i])
+                i += 1
+                continue
+
+            pattern = _STRING_SPECIAL if self._in_string else _STRUCTURAL
+            match = pattern.search(text, i)
+            if match is None:
+                buffer.append(text[i:])
+                return n
+
+            j = match.start()
+            ch = text[j]
+            buffer.append(text[i:j + 1])
+            i = j + 1
+
+            if self._in_string:
+                if ch == "\\":
+                    self._escape = True
+                else:
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch == "{" or ch == "[":
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_object(new_cards)
+                    return i
+        return i
+
+    def _start_object(self):
+        self._state = "object"
+        self._depth = 1
+        self._in_string = False
+        self._escape = False
+        self._buffer = ["{"]
+
+    def _finish_object(self, new_cards: list):
+        self._state = "array"
+        try:
+            obj = json.loads("".join(self._buffer))
+            if isinstance(obj, dict):
+                new_cards.append(obj)
+        except json.JSONDecodeError:
+            pass
+        self._buffer = []
+
+    def _close_array(self, new_cards: list):
+        if self.cards or new_cards:
+            self.closed = True
+        else:
+            # arreglo vacío o sin tarjetas válidas: seguimos buscando
+            self._state = "search"
+
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"\s*")
+
+def _skip_object(text: str, i: int) -> int:
+    """
+    Dado `text[i] == "{"`, devuelve la posición siguiente a su `}` de cierre
+    (respetando strings) o -1 si el objeto está truncado.
+    """
+    depth = 0
+    in_string = False
+    n = len(text)
+    while i < n:
+        match = (_STRING_SPECIAL if in_string else _STRUCTURAL).search(text, i)
+        if match is None:
+            return -1
+        j = match.start()
+        ch = text[j]
+        i = j + 1
+        if in_string:
+            if ch == "\\":
+                i += 1
+            else:
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{" or ch == "[":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+
+# un arreglo candidato: "[" seguido (tras espacios) de un objeto
+_CANDIDATE = re.compile(r"\[\s*\{")
+# final probable de un objeto del arreglo: "}" seguido de otro objeto o del "]"
+_OBJECT_END = re.compile(r"\}\s*(?:,\s*\{|\])")
+
+def _decode_delimited(text: str, i: int) -> tuple[dict | None, int]:
+    """
+    Delimita con el escáner el objeto que empieza en `text[i] == "{"` y lo
+    decodifica. Devuelve (objeto o None si está mal formado, posición
+    siguiente a su "}") o (None, -1) si está truncado.
+    """
+    end = _skip_object(text, i)
+    if end < 0:
+        return None, -1
+    try:
+        value = json.loads(text[i:end])
+        return (value if isinstance(value, dict) else None), end
+    except json.JSONDecodeError:
+        return None, end
+
+
+def _cards_from_array(text: str, start: int, fast_path: bool) -> tuple[list[dict], int]:
+    """
+    Lee los objetos del arreglo que empieza en `text[start] == "["` (seguido
+    de un objeto). Devuelve las tarjetas recuperadas y la posición donde
+    continuar buscando.
+    """
+    # camino rápido: el arreglo completo es JSON válido (una sola llamada en C)
+    if fast_path:
+        try:
+            value, end = _decoder.raw_decode(text, start)
+            if isinstance(value, list):
+                return [item for item in value if isinstance(item, dict)], end
+        except json.JSONDecodeError:
+            pass
+
+    # camino tolerante: objeto a objeto, descartando los mal formados. Cada
+    # objeto se decodifica solo hasta su final probable, porque un error de
+    # json cuesta O(posición) y sobre el texto completo sería cuadrático; si
+    # no encaja (objeto mal formado o "}" dentro de un valor) se delimita con
+    # el escáner.
+    n = len(text)
+    cards = []
+    i = _WHITESPACE.match(text, start + 1).end()
+    while i < n and text[i] == "{":
+        match = _OBJECT_END.search(text, i)
+        if match is not None:
+            close = match.start() + 1
+            try:
+                value, end = _decoder.raw_decode(text[i:close])
+            except json.JSONDecodeError:
+                end = -1
+            if i + end == close:
+                if isinstance(value, dict):
+                    cards.append(value)
+                if text[match.end() - 1] == "]":
+                    return cards, match.end()
+                i = match.end() - 1
+                continue
+
+        card, end = _decode_delimited(text, i)
+        if end < 0:
+            return cards, n  # arreglo truncado
+        if card is not None:
+            cards.append(card)
+        i = _WHITESPACE.match(text, end).end()
+        if i < n and text[i] == ",":
+            i = _WHITESPACE.match(text, i + 1).end()
+    return cards, i
+
+
+def extract_card_objects(text: str) -> list[dict]:
+    """
+    Recupera en tiempo lineal todas las tarjetas completas del primer arreglo
+    JSON de `text` que contenga alguna, aunque esté truncado o tenga objetos
+    mal formados.
+    """
+    fast_path = True
+    match = _CANDIDATE.search(text)
+    while match is not None:
+        start = match.start()
+        cards, next_i = _cards_from_array(text, start, fast_path)
+        if cards:
+            return cards
+        # el camino rápido solo se intenta una vez: un fallo de json cuesta
+        # O(posición) y con muchos candidatos sería cuadrático
+        fast_path = False
+        match = _CANDIDATE.search(text, max(next_i, start + 1))
+    return []
@@ -0,0 +1,184 @@
+from contextlib import asynccontextmanager
+from services.http_client import get_http_client
+import asyncio
+import os
+import time
+
+def _split_env(name: str) -> list[str]:
+    return [v.strip() for v in os.getenv(name, "").split(",") if v.strip()]
+
+# Lista de servidores LM Studio / llama.cpp. MODEL_HOSTS admite varios
+# separados por comas; si no está definido se usa MODEL_HOST.
+MODEL_HOSTS = _split_env("MODEL_HOSTS") or [os.getenv("MODEL_HOST") or "http://localhost:1234"]
+# Peticiones simultáneas por servidor: un valor para todos o uno por servidor.
+MODEL_HOST_CONCURRENCY = [int(v) for v in _split_env("MODEL_HOST_CONCURRENCY")] or [8]
+
+LLM_BACKEND_MAX_FAILURES = int(os.getenv("LLM_BACKEND_MAX_FAILURES", "3"))
+LLM_BACKEND_EJECT_SECONDS = float(os.getenv("LLM_BACKEND_EJECT_SECONDS", "30"))
+LLM_BACKEND_SLOW_FACTOR = float(os.getenv("LLM_BACKEND_SLOW_FACTOR", "3"))
+LLM_HEALTH_INTERVAL = float(os.getenv("LLM_HEALTH_INTERVAL", "15"))
+
+class Backend:
+    def __init__(self, url: str, max_concurrency: int):
+        self.url = url.rstrip("/")
+        self.max_concurrency = max(1, max_concurrency)
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.ejected = False  # expulsado y aún sin readmitir (aunque la expulsión haya vencido)
+        self.latency_ewma: float | None = None
+        self.total_requests = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self.ejected_until <= time.monotonic()
+
+    def status(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "max_concurrency": self.max_concurrency,
+            "consecutive_failures": self.failures,
+            "latency_ewma": self.latency_ewma,
+            "total_requests": self.total_requests,
+        }
+
+class BackendPool:
+    """
+    Reparte las peticiones al modelo entre varios servidores eligiendo el que
+    tiene menos peticiones en curso, respetando el límite de cada uno. Los
+    servidores que fallan seguido o van mucho más lentos que el resto se
+    expulsan un tiempo y vuelven cuando pasan el health check.
+    """
+
+    def __init__(self, urls: list[str], concurrency: list[int]):
+        self.backends = [
+            Backend(url, concurrency[i] if i < len(concurrency) else concurrency[-1])
+            for i, url in enumerate(urls)
+        ]
+        self._condition: asyncio.Condition | None = None
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    def _pick(self, exclude: set[str]) -> Backend | None:
+        candidates = [b for b in self.backends if b.healthy and b.url not in exclude]
+        if not candidates:
+            # si todos están expulsados es preferible intentarlo a fallar sin más
+            candidates = [b for b in self.backends if b.url not in exclude]
+        available = [b for b in candidates if b.outstanding < b.max_concurrency]
+        if not available:
+            return None
+        return min(available, key=lambda b: (b.outstanding / b.max_concurrency, b.latency_ewma or 0.0))
+
+    @asynccontextmanager
+    async def acquire(self, exclude: set[str] | None = None):
+        exclude = exclude or set()
+        if all(b.url in exclude for b in self.backends):
+            raise RuntimeError("No LLM backends left to try.")
+        condition = self._get_condition()
+        async with condition:
+            backend = self._pick(exclude)
+            while backend is None:
+                await condition.wait()
+                backend = self._pick(exclude)
+            backend.outstanding += 1
+        try:
+            yield backend
+        finally:
+            async with condition:
+                backend.outstanding -= 1
+                condition.notify_all()
+
+    def pick_url(self) -> str:
+        healthy = [b for b in self.backends if b.healthy]
+        return (healthy or self.backends)[0].url
+
+    def report_success(self, backend: Backend, latency: float):
+        backend.total_requests += 1
+        backend.failures = 0
+        if backend.ejected and backend.healthy:
+            # primera respuesta tras vencer la expulsión: la media anterior ya no vale
+            self._readmit(backend)
+        if backend.latency_ewma is None:
+            backend.latency_ewma = latency
+        else:
+            backend.latency_ewma = 0.8 * backend.latency_ewma + 0.2 * latency
+        self._eject_if_slow(backend)
+
+    def report_failure(self, backend: Backend):
+        backend.total_requests += 1
+        backend.failures += 1
+        if backend.failures >= LLM_BACKEND_MAX_FAILURES:
+            self._eject(backend, "fallos consecutivos")
+
+    def _eject(self, backend: Backend, reason: str):
+        backend.ejected_until = time.monotonic() + LLM_BACKEND_EJECT_SECONDS
+        backend.ejected = True
+        print(f"[WARN] Backend {backend.url} expulsado {LLM_BACKEND_EJECT_SECONDS:.0f}s por {reason}")
+
+    def _eject_if_slow(self, backend: Backend):
+        others = [
+            b.latency_ewma for b in self.backends
+            if b is not backend and b.healthy and b.latency_ewma is not None
+        ]
+        if others and backend.latency_ewma > LLM_BACKEND_SLOW_FACTOR * min(others):
+            self._eject(backend, "lentitud")
+
+    def _readmit(self, backend: Backend):
+        backend.failures = 0
+        backend.latency_ewma = None
+        backend.ejected_until = 0.0
+        backend.ejected = False
+        print(f"[INFO] Backend {backend.url} readmitido")
+
+    async def check_health(self):
+        client = get_http_client()
+        for backend in self.backends:
+            # también se sondean los expulsados por lentitud, que no tienen fallos
+            if not backend.ejected and backend.failures == 0:
+                continue
+            if backend.ejected_until > time.monotonic():
+                continue  # aún cumpliendo la expulsión
+            try:
+                response = await client.get(f"{backend.url}/v1/models", timeout=5.0)
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            if ok:
+                self._readmit(backend)
+            else:
+                self._eject(backend, "health check fallido")
+
+    def status(self) -> list[dict]:
+        return [b.status() for b in self.backends]
+
+
+backend_pool = BackendPool(MODEL_HOSTS, MODEL_HOST_CONCURRENCY)
+_health_task: asyncio.Task | None = None
+
+async def _health_loop():
+    while True:
+        await asyncio.sleep(LLM_HEALTH_INTERVAL)
+        try:
+            await backend_pool.check_health()
+        except Exception as e:
+            print(f"[ERROR] Health check de backends: {e}")
+
+def start_backend_health_checks():
+    global _health_task
+    if _health_task is None and len(backend_pool.backends) > 1:
+        _health_task = asyncio.create_task(_health_loop())
+
+async def stop_backend_health_checks():
+    global _health_task
+    if _health_task is not None:
+        _health_task.cancel()
+        try:
+            await _health_task
+        except asyncio.CancelledError:
+            pass
+        _health_task = None
@@ -0,0 +1,126 @@
+from pathlib import Path
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Caché persistente de respuestas del modelo, direccionada por contenido.
+# Las funciones hacen E/S de disco: desde código asíncrono se llaman con
+# asyncio.to_thread para no bloquear el event loop.
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+LLM_CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR", "/app/cache"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+_lock = threading.Lock()
+_conn: sqlite3.Connection | None = None
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_size = 0  # suma de `size` de todas las entradas, para no recalcularla en cada inserción
+
+def _get_conn() -> sqlite3.Connection:
+    global _conn, _size
+    if _conn is None:
+        LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(LLM_CACHE_DIR / "llm_cache.sqlite", check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)")
+        _conn.commit()
+        _size = _conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+    return _conn
+
+def make_cache_key(messages: list[dict], temperature, max_tokens, model: str) -> str:
+    payload = json.dumps(
+        {"messages": messages, "temperature": temperature, "max_tokens": max_tokens, "model": model},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def get_cached_response(key: str) -> str | None:
+    with _lock:
+        conn = _get_conn()
+        row = conn.execute("SELECT response FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            _stats["misses"] += 1
+            return None
+        conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        conn.commit()
+        _stats["hits"] += 1
+        return row[0]
+
+def _entry_size(conn: sqlite3.Connection, key: str) -> int:
+    row = conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else 0
+
+def store_response(key: str, response: str):
+    global _size
+    size = len(response.encode("utf-8"))
+    if size > LLM_CACHE_MAX_BYTES:
+        return
+    with _lock:
+        conn = _get_conn()
+        _size -= _entry_size(conn, key)
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+            (key, response, size, time.time()),
+        )
+        _size += size
+        _evict(conn)
+        conn.commit()
+
+def drop_response(key: str):
+    global _size
+    with _lock:
+        conn = _get_conn()
+        _size -= _entry_size(conn, key)
+        conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+        conn.commit()
+
+def _evict(conn: sqlite3.Connection):
+    # LRU: elimina las entradas menos usadas hasta volver bajo el límite
+    global _size
+    if _size <= LLM_CACHE_MAX_BYTES:
+        return
+    total = _size
+    cursor = conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access ASC")
+    to_delete = []
+    for key, size in cursor:
+        if total <= LLM_CACHE_MAX_BYTES:
+            break
+        to_delete.append((key,))
+        total -= size
+    cursor.close()
+    conn.executemany("DELETE FROM llm_cache WHERE key = ?", to_delete)
+    _size = total
+    _stats["evictions"] += len(to_delete)
+
+def cache_stats() -> dict:
+    with _lock:
+        conn = _get_conn()
+        entries = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {
+            "enabled": LLM_CACHE_ENABLED,
+            "hits": _stats["hits"],
+            "misses": _stats["misses"],
+            "evictions": _stats["evictions"],
+            "entries": entries,
+            "size_bytes": _size,
+            "max_bytes": LLM_CACHE_MAX_BYTES,
+        }
+
+def clear_cache():
+    global _size
+    with _lock:
+        conn = _get_conn()
+        conn.execute("DELETE FROM llm_cache")
+        conn.commit()
+        _size = 0
@@ -1,23 +1,196 @@
 import os
-import httpx
+import asyncio
+import json
+import time
 from schemas.llm_schema import LLMRequest, LLMResponse
+from typing import Callable, Optional
+from services.http_client import get_http_client
+from services import llm_cache
+from services.llm_backends import backend_pool
+import httpx
+
+CHAT_COMPLETIONS_PATH = "/v1/chat/completions"
+MODELS_PATH = "/v1/models"
+
+# El modelo cargado forma parte de la clave de caché; se consulta a LM Studio
+# como mucho una vez cada MODEL_ID_TTL segundos.
+MODEL_ID_TTL = float(os.getenv("MODEL_ID_TTL", "30"))
+_model_id_cache = {"value": "", "fetched_at": 0.0}
+
+# Microservicio lms (corre en el host) que expone los modelos cargados y su contexto.
+LMS_URL = os.getenv("LMS_URL", "http://host.docker.internal:5678")
+_context_length_cache = {"value": None, "fetched_at": 0.0}
+
+async def get_loaded_model_id() -> str:
+    now = time.monotonic()
+    if _model_id_cache["fetched_at"] and now - _model_id_cache["fetched_at"] < MODEL_ID_TTL:
+        return _model_id_cache["value"]
 
-MODEL_HOST = os.getenv("MODEL_HOST")
-LMSTUDIO_URL = f"{MODEL_HOST}/v1/chat/completions"
+    model_id = ""
+    try:
+        response = await get_http_client().get(f"{backend_pool.pick_url()}{MODELS_PATH}", timeout=5.0)
+        if response.status_code == 200:
+            models = response.json().get("data", [])
+            model_id = ",".join(sorted(m.get("id", "") for m in models))
+    except Exception as e:
+        print(f"[WARN] No se pudo consultar el modelo cargado: {e}")
+
+    _model_id_cache["value"] = model_id
+    _model_id_cache["fetched_at"] = now
+    return model_id
+
+async def get_loaded_context_length() -> int | None:
+    """
+    Longitud de contexto del modelo LLM cargado (la menor si hay varios),
+    según `/lms/loaded`. Devuelve None si no se puede determinar.
+    """
+    now = time.monotonic()
+    if _context_length_cache["fetched_at"] and now - _context_length_cache["fetched_at"] < MODEL_ID_TTL:
+        return _context_length_cache["value"]
+
+    context_length = None
+    try:
+        response = await get_http_client().get(f"{LMS_URL}/lms/loaded", timeout=5.0)
+        if response.status_code == 200:
+            lengths = [
+                m["contextLength"] for m in response.json()
+                if m.get("type") == "llm" and m.get("contextLength")
+            ]
+            context_length = min(lengths) if lengths else None
+    except Exception as e:
+        print(f"[WARN] No se pudo consultar el contexto del modelo: {e}")
+
+    _context_length_cache["value"] = context_length
+    _context_length_cache["fetched_at"] = now
+    return context_length
+
+async def forget_response(data: LLMRequest):
+    """
+    Borra de la caché la respuesta guardada para `data`. Se usa cuando el
+    texto no se pudo interpretar, para que un reintento vuelva a preguntar
+    al modelo en lugar de repetir la misma respuesta inválida.
+    """
+    if not (llm_cache.LLM_CACHE_ENABLED and data.use_cache):
+        return
+    messages = [msg.dict() for msg in data.messages]
+    model_id = await get_loaded_model_id()
+    key = llm_cache.make_cache_key(messages, data.temperature, data.max_tokens, model_id)
+    await asyncio.to_thread(llm_cache.drop_response, key)
 
 async def query_llm(data: LLMRequest) -> LLMResponse:
+    messages = [msg.dict() for msg in data.messages]
     payload = {
         "model": "",  
-        "messages": [msg.dict() for msg in data.messages],
+        "messages": messages,
         "temperature": data.temperature,
         "max_tokens": data.max_tokens,
     }
 
-    async with httpx.AsyncClient(timeout=None) as client:
-        response = await client.post(LMSTUDIO_URL, json=payload)
+    cache_key = None
+    if llm_cache.LLM_CACHE_ENABLED and data.use_cache:
+        model_id = await get_loaded_model_id()
+        cache_key = llm_cache.make_cache_key(messages, data.temperature, data.max_tokens, model_id)
+        cached = await asyncio.to_thread(llm_cache.get_cached_response, cache_key)
+        if cached is not None:
+            return LLMResponse(response=cached)
+
+    client = get_http_client()
+    tried = set()
+    while True:
+        async with backend_pool.acquire(exclude=tried) as backend:
+            started = time.monotonic()
+            try:
+                response = await client.post(f"{backend.url}{CHAT_COMPLETIONS_PATH}", json=payload)
+            except httpx.TransportError:
+                # fallo de conexión: se reintenta en otro servidor si queda alguno
+                backend_pool.report_failure(backend)
+                tried.add(backend.url)
+                if len(tried) >= len(backend_pool.backends):
+                    raise
+                continue
+
+            if response.status_code >= 500:
+                backend_pool.report_failure(backend)
+            else:
+                backend_pool.report_success(backend, time.monotonic() - started)
+            break
 
     if response.status_code != 200:
         raise Exception(f"LM Studio error: {response.text}")
 
     content = response.json()["choices"][0]["message"]["content"]
+    if cache_key is not None:
+        await asyncio.to_thread(llm_cache.store_response, cache_key, content)
+    return LLMResponse(response=content)
+
+async def query_llm_stream(
+    data: LLMRequest,
+    on_delta: Optional[Callable[[str], bool]] = None
+) -> LLMResponse:
+    """
+    Igual que `query_llm` pero con `stream: true`. Cada fragmento de texto se
+    pasa a `on_delta`; si devuelve True se corta la conexión, lo que detiene
+    la generación en el servidor, y se devuelve lo recibido hasta ese momento.
+    """
+    messages = [msg.dict() for msg in data.messages]
+    payload = {
+        "model": "",
+        "messages": messages,
+        "temperature": data.temperature,
+        "max_tokens": data.max_tokens,
+        "stream": True,
+    }
+
+    cache_key = None
+    if llm_cache.LLM_CACHE_ENABLED and data.use_cache:
+        model_id = await get_loaded_model_id()
+        cache_key = llm_cache.make_cache_key(messages, data.temperature, data.max_tokens, model_id)
+        cached = await asyncio.to_thread(llm_cache.get_cached_response, cache_key)
+        if cached is not None:
+            if on_delta is not None:
+                on_delta(cached)
+            return LLMResponse(response=cached)
+
+    client = get_http_client()
+    tried = set()
+    while True:
+        parts = []
+        async with backend_pool.acquire(exclude=tried) as backend:
+            started = time.monotonic()
+            try:
+                async with client.stream("POST", f"{backend.url}{CHAT_COMPLETIONS_PATH}", json=payload) as response:
+                    if response.status_code != 200:
+                        body = await response.aread()
+                        if response.status_code >= 500:
+                            backend_pool.report_failure(backend)
+                        else:
+                            backend_pool.report_success(backend, time.monotonic() - started)
+                        raise Exception(f"LM Studio error: {body.decode(errors='replace')}")
+
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        event_data = line[len("data:"):].strip()
+                        if event_data == "[DONE]":
+                            break
+                        choices = json.loads(event_data).get("choices") or [{}]
+                        delta = (choices[0].get("delta") or {}).get("content")
+                        if not delta:
+                            continue
+                        parts.append(delta)
+                        if on_delta is not None and on_delta(delta):
+                            break
+            except httpx.TransportError:
+                backend_pool.report_failure(backend)
+                tried.add(backend.url)
+                # solo se reintenta si aún no se entregó texto a `on_delta`
+                if parts or len(tried) >= len(backend_pool.backends):
+                    raise
+                continue
+            backend_pool.report_success(backend, time.monotonic() - started)
+        break
+
+    content = "".join(parts)
+    if cache_key is not None:
+        await asyncio.to_thread(llm_cache.store_response, cache_key, content)
     return LLMResponse(response=content)
@@ -1,23 +1,25 @@
-from appwrite.client import Client
-from appwrite.services.storage import Storage
-from appwrite.services.storage import Storage
-from appwrite.input_file import InputFile
-from appwrite.services.databases import Databases
+from __future__ import annotations
 from schemas.decks_schema import DeckCreationResult
 from .deck_creator import save_deck_metadata
-from appwrite.query import Query
-from typing import Dict
+from .catalog import query_items, get_item, item_ids
+from typing import Dict, TYPE_CHECKING
 from pathlib import Path
 import os
 import json
 import re
 
+if TYPE_CHECKING:
+    from appwrite.client import Client
+
 DECKS_DIR = Path("/app/decks")
 DECKS_DIR.mkdir(parents=True, exist_ok=True)
 TEMPLATES_DIR = Path("/app/templates")
 TEMPLATES_DIR.mkdir(parents=True, exist_ok=True)
 
 def upload_deck_files(client : Client, user_id: str) -> Dict[str, str]:
+    from appwrite.services.storage import Storage
+    from appwrite.input_file import InputFile
+    from appwrite.query import Query
     storage = Storage(client)
     uploaded = {}
 
@@ -55,21 +57,17 @@ def upload_deck_files(client : Client, user_id: str) -> Dict[str, str]:
     return uploaded
 
 def upload_templates(client: Client, user_id: str):
+    from appwrite.services.databases import Databases
+    from appwrite.query import Query
     database_id = os.getenv("APPWRITE_DB_ID")
     collection_id = os.getenv("APPWRITE_COLLECTION_ID_TEMPLATES")  
     db = Databases(client)
     
     uploaded = []
 
-    for filename in os.listdir(TEMPLATES_DIR):
-        if not filename.endswith(".json"):
-            continue
-
-        file_path = os.path.join(TEMPLATES_DIR, filename)
+    templates, _ = query_items("template")
+    for data in templates:
         try:
-            with open(file_path, "r") as f:
-                data = json.load(f)
-
             template_id_str = str(data["template_id"])
 
             existing_docs = db.list_documents(
@@ -107,34 +105,31 @@ def upload_templates(client: Client, user_id: str):
             print(f"[UPLOAD] Template {template_id_str} uploaded")
 
         except Exception as e:
-            print(f"[ERROR] Failed to upload template from {filename}: {e}")
+            print(f"[ERROR] Failed to upload template {data['template_id']}: {e}")
     
     return {"uploaded_templates": uploaded}
 
-def get_meta_path_from_apkg(apkg_path: str) -> str:
+def get_deck_id_from_apkg(apkg_path: str) -> int:
+    # los .apkg se llaman "{nombre}_{deck_id}.apkg" y el nombre puede tener números
     filename = os.path.basename(apkg_path)  
-    match = re.search(r'(\d+)', filename)
+    match = re.search(r'(\d+)\.apkg$', filename)
     if not match:
         raise ValueError(f"No se pudo extraer número del archivo {filename}")
-    number = match.group(1)
-    meta_filename = f"{number}.json"
-    return os.path.join("/app/deck_meta", meta_filename)
+    return int(match.group(1))
 
 def upload_deck_metadata(client: Client, user_id: str, uploaded: Dict[str, str]):
+    from appwrite.services.databases import Databases
     databases = Databases(client)
     database_id = os.getenv("APPWRITE_DB_ID")
     collection_id = os.getenv("APPWRITE_COLLECTION_ID_DECK_META")
 
     for path, file_id in uploaded.items():
         try:
-            meta_path = get_meta_path_from_apkg(path)
-            if not os.path.exists(meta_path):
+            meta = get_item("deck", get_deck_id_from_apkg(path))
+            if meta is None:
                 print(f"[ERROR] Metadata file not found for {path}")
                 continue
 
-            with open(meta_path, "r", encoding="utf-8") as f:
-                meta = json.load(f)
-
             document = databases.create_document(
                 database_id=database_id,
                 collection_id=collection_id,
@@ -159,6 +154,8 @@ def upload_deck_metadata(client: Client, user_id: str, uploaded: Dict[str, str])
             print(f"[ERROR] No se pudo subir metadata de {path}: {e}")
 
 def download_templates(client: Client, user_id: str):
+    from appwrite.services.databases import Databases
+    from appwrite.query import Query
     database_id = os.getenv("APPWRITE_DB_ID")
     collection_id = os.getenv("APPWRITE_COLLECTION_ID_TEMPLATES")
     db = Databases(client)
@@ -171,10 +168,7 @@ def download_templates(client: Client, user_id: str):
 
     downloaded = []
 
-    local_template_ids = set()
-    for filename in os.listdir(TEMPLATES_DIR):
-        if filename.endswith(".json"):
-            local_template_ids.add(filename.replace(".json", ""))
+    local_template_ids = {str(tid) for tid in item_ids("template")}
 
     for template_doc in remote_templates:
         tid = template_doc["template_id"]
@@ -197,6 +191,9 @@ def download_deck_files(client: Client, user_id: str) -> list[str]:
     Descarga los archivos de mazo (.apkg) y sus metadatos (.json) desde Appwrite,
     guardando cada tipo de archivo en su directorio correspondiente.
     """
+    from appwrite.services.storage import Storage
+    from appwrite.services.databases import Databases
+    from appwrite.query import Query
     database_id = os.getenv("APPWRITE_DB_ID")
     collection_id = os.getenv("APPWRITE_COLLECTION_ID_DECK_META")
     bucket_id = os.getenv("APPWRITE_BUCKET_ID_DECKS")
@@ -1,9 +1,9 @@
 from schemas.template_schema import TemplateCreateRequest, TemplateResponse
-from pathlib import Path
+from services.catalog import TEMPLATES_DIR, index_file, remove_file, query_items
 import json
 import uuid
 
-TEMPLATE_DIR = Path("/app/templates")
+TEMPLATE_DIR = TEMPLATES_DIR
 TEMPLATE_DIR.mkdir(parents=True, exist_ok=True)
 
 def create_template_file(data: TemplateCreateRequest) -> TemplateResponse:
@@ -19,22 +19,24 @@ def create_template_file(data: TemplateCreateRequest) -> TemplateResponse:
     with open(filepath, "w", encoding="utf-8") as f:
         json.dump(template_data, f, ensure_ascii=False, indent=2)
 
-    return TemplateResponse(**template_data)
+    template = TemplateResponse(**template_data)
+    index_file("template", filepath, template)
+    return template
 
 def delete_template_file(template_id: int) -> bool:
     filepath = TEMPLATE_DIR / f"{template_id}.json"
     if filepath.exists():
         filepath.unlink()
+        remove_file("template", filepath)
         return True
     return False
 
-def list_all_templates() -> list[TemplateResponse]:
-    templates = []
-    for file in TEMPLATE_DIR.glob("*.json"):
-        try:
-            with open(file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                templates.append(TemplateResponse(**data))
-        except Exception:
-            continue  
-    return templates
+def list_all_templates(
+    sort: str = "created",
+    descending: bool = True,
+    limit: int | None = None,
+    offset: int = 0
+) -> tuple[list[TemplateResponse], int]:
+    """Devuelve (página de templates, total) desde el índice del catálogo."""
+    items, total = query_items("template", None, sort, descending, limit, offset)
+    return [TemplateResponse(**data) for data in items], total
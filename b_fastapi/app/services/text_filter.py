@@ -0,0 +1,146 @@
+from collections import Counter
+import hashlib
+import os
+import re
+
+# Filtro previo al modelo: quita encabezados/pies repetidos, números de página,
+# índices y avisos de copyright, y descarta chunks vacíos de contenido o repetidos.
+MIN_CHUNK_WORDS = int(os.getenv("MIN_CHUNK_WORDS", "12"))
+REPEATED_LINE_FRACTION = float(os.getenv("REPEATED_LINE_FRACTION", "0.5"))
+MIN_PAGES_FOR_REPEATS = 3
+# páginas que se observan antes de decidir qué líneas se repiten (ingesta en streaming)
+REPEATED_LINE_SAMPLE_PAGES = int(os.getenv("REPEATED_LINE_SAMPLE_PAGES", "24"))
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+_PAGE_NUMBER = re.compile(r"^\W*(p[áa]g(ina)?|page|p\.)?\s*\d+(\s*(de|of|/)\s*\d+)?\W*$", re.IGNORECASE)
+_TOC_LINE = re.compile(r"(\.{4,}|…{2,}|\s{3,})\s*\d+\s*$")
+_BOILERPLATE = re.compile(
+    r"(©|copyright|all rights reserved|todos los derechos reservados|isbn[\s:-]*[\dx-]{10,})",
+    re.IGNORECASE,
+)
+_WORD = re.compile(r"[^\W\d_]{2,}")
+
+def _line_key(line: str) -> str:
+    # "Capítulo 3 — página 41" y "Capítulo 3 — página 42" cuentan como la misma línea
+    return _SPACES.sub(" ", _DIGITS.sub("#", line.strip().lower()))
+
+def _repeated_line_keys(pages: list[str]) -> set[str]:
+    if len(pages) < MIN_PAGES_FOR_REPEATS:
+        return set()
+    counts = Counter()
+    for page in pages:
+        counts.update({_line_key(line) for line in page.splitlines() if line.strip()})
+    min_pages = max(MIN_PAGES_FOR_REPEATS, int(len(pages) * REPEATED_LINE_FRACTION))
+    return {key for key, n in counts.items() if n >= min_pages}
+
+def _strip_page(page: str, repeated: set[str]) -> tuple[str, int]:
+    removed = 0
+    kept = []
+    for line in page.splitlines():
+        if line.strip() and (_line_key(line) in repeated or _PAGE_NUMBER.match(line.strip())):
+            removed += 1
+            continue
+        kept.append(line)
+    return "\n".join(kept), removed
+
+def _add(report: dict | None, key: str, value: int):
+    if report is not None:
+        report[key] = report.get(key, 0) + value
+
+def strip_repeated_lines(pages: list[str], report: dict | None = None) -> list[str]:
+    """
+    Elimina de cada página las líneas que se repiten en gran parte del
+    documento (encabezados, pies) y las que solo son un número de página.
+    """
+    repeated = _repeated_line_keys(pages)
+    cleaned = []
+    for page in pages:
+        text, removed = _strip_page(page, repeated)
+        _add(report, "repeated_lines_removed", removed)
+        cleaned.append(text)
+    return cleaned
+
+class BoilerplateStripper:
+    """
+    Versión incremental de `strip_repeated_lines` para la ingesta en
+    streaming: las primeras `sample_pages` páginas se retienen para aprender
+    qué líneas se repiten y, a partir de ahí, cada página se limpia al llegar.
+    """
+
+    def __init__(self, report: dict | None = None, sample_pages: int = REPEATED_LINE_SAMPLE_PAGES):
+        self.report = report
+        _add(report, "repeated_lines_removed", 0)
+        self.sample_pages = sample_pages
+        self._sample: list[str] = []
+        self._repeated: set[str] | None = None
+
+    def _clean(self, page: str) -> str:
+        text, removed = _strip_page(page, self._repeated)
+        _add(self.report, "repeated_lines_removed", removed)
+        return text
+
+    def feed(self, page: str) -> list[str]:
+        if self._repeated is not None:
+            return [self._clean(page)]
+        self._sample.append(page)
+        if len(self._sample) < self.sample_pages:
+            return []
+        return self.flush()
+
+    def flush(self) -> list[str]:
+        if self._repeated is None:
+            self._repeated = _repeated_line_keys(self._sample)
+        cleaned = [self._clean(page) for page in self._sample]
+        self._sample = []
+        return cleaned
+
+def is_low_information(chunk: str) -> bool:
+    lines = [line for line in chunk.splitlines() if line.strip()]
+    if not lines:
+        return True
+    if len(_WORD.findall(chunk)) < MIN_CHUNK_WORDS:
+        return True
+    # índice: la mayoría de líneas acaban en "...... 123"
+    if sum(1 for line in lines if _TOC_LINE.search(line)) > len(lines) / 2:
+        return True
+    # página legal / copyright
+    if _BOILERPLATE.search(chunk) and len(_WORD.findall(_BOILERPLATE.sub("", chunk))) < MIN_CHUNK_WORDS * 4:
+        return True
+    return False
+
+class ChunkFilter:
+    """
+    Descarta chunks sin contenido útil y los duplicados exactos (ignorando
+    espacios y mayúsculas). `accept(chunk)` devuelve False si hay que saltarlo.
+    """
+
+    def __init__(self, report: dict | None = None):
+        self.report = report
+        for key in ("chunks_total", "chunks_skipped_low_info", "chunks_skipped_duplicate"):
+            _add(report, key, 0)
+        self._seen: set[bytes] = set()
+
+    def accept(self, chunk: str) -> bool:
+        _add(self.report, "chunks_total", 1)
+        if is_low_information(chunk):
+            _add(self.report, "chunks_skipped_low_info", 1)
+            return False
+        digest = hashlib.sha1(_SPACES.sub(" ", chunk.strip().lower()).encode("utf-8")).digest()
+        if digest in self._seen:
+            _add(self.report, "chunks_skipped_duplicate", 1)
+            return False
+        self._seen.add(digest)
+        return True
+
+def filter_chunks(chunks: list[str], report: dict | None = None) -> list[str]:
+    chunk_filter = ChunkFilter(report)
+    return [chunk for chunk in chunks if chunk_filter.accept(chunk)]
+
+def format_skip_report(report: dict) -> str:
+    skipped = report.get("chunks_skipped_low_info", 0) + report.get("chunks_skipped_duplicate", 0)
+    return (
+        f"{report.get('repeated_lines_removed', 0)} líneas repetidas eliminadas, "
+        f"{skipped} de {report.get('chunks_total', 0)} chunks descartados "
+        f"({report.get('chunks_skipped_low_info', 0)} sin contenido, {report.get('chunks_skipped_duplicate', 0)} duplicados)"
+    )
@@ -0,0 +1,98 @@
+from collections import deque
+from typing import Callable, List
+
+# Separadores por prioridad: párrafo, línea, fin de frase, coma, espacio.
+DEFAULT_SEPARATORS = ["\n\n", "\n", ".", "!", "?", ",", " "]
+
+class RecursiveTextSplitter:
+    """
+    Divide el texto con la misma semántica que el RecursiveCharacterTextSplitter
+    de langchain (mismo resultado para los mismos parámetros): se corta por
+    el primer separador presente, conservándolo al inicio de cada trozo; los
+    trozos pequeños se juntan hasta `chunk_size` con `chunk_overlap` de
+    solape, y los que no caben se vuelven a dividir con los separadores
+    siguientes.
+
+    A diferencia del original, la longitud de cada trozo se calcula una sola
+    vez, la ventana de solape es una deque y los separadores se buscan con
+    `str.split` en lugar de expresiones regulares.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int,
+        chunk_overlap: int,
+        length_function: Callable[[str], int] = len,
+        separators: List[str] | None = None
+    ):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) is larger than chunk_size ({chunk_size}).")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length_function = length_function
+        self.separators = separators or DEFAULT_SEPARATORS
+        # los separadores se conservan dentro de los trozos, así que se unen con ""
+        self._join_len = length_function("")
+
+    def split_text(self, text: str) -> List[str]:
+        chunks: List[str] = []
+        self._split(text, self.separators, chunks)
+        return chunks
+
+    def _split(self, text: str, separators: List[str], out: List[str]):
+        separator = separators[-1]
+        remaining: List[str] = []
+        for i, candidate in enumerate(separators):
+            if candidate in text:
+                separator = candidate
+                remaining = separators[i + 1:]
+                break
+
+        pieces = text.split(separator)
+        splits = [pieces[0]] + [separator + piece for piece in pieces[1:]]
+
+        good: List[str] = []
+        good_lens: List[int] = []
+        for piece in splits:
+            if not piece:
+                continue
+            length = self.length_function(piece)
+            if length < self.chunk_size:
+                good.append(piece)
+                good_lens.append(length)
+                continue
+            if good:
+                self._merge(good, good_lens, out)
+                good, good_lens = [], []
+            if remaining:
+                self._split(piece, remaining, out)
+            else:
+                out.append(piece)
+        if good:
+            self._merge(good, good_lens, out)
+
+    def _merge(self, splits: List[str], lengths: List[int], out: List[str]):
+        join_len = self._join_len
+        current: deque = deque()
+        current_lens: deque = deque()
+        total = 0
+        for piece, length in zip(splits, lengths):
+            if total + length + (join_len if current else 0) > self.chunk_size and current:
+                self._emit(current, out)
+                # se descartan trozos por delante hasta dejar solo el solape
+                while total > self.chunk_overlap or (
+                    total + length + (join_len if current else 0) > self.chunk_size and total > 0
+                ):
+                    total -= current_lens[0] + (join_len if len(current) > 1 else 0)
+                    current.popleft()
+                    current_lens.popleft()
+            current.append(piece)
+            current_lens.append(length)
+            total += length + (join_len if len(current) > 1 else 0)
+        self._emit(current, out)
+
+    @staticmethod
+    def _emit(current: deque, out: List[str]):
+        chunk = "".join(current).strip()
+        if chunk:
+            out.append(chunk)
@@ -1,24 +1,29 @@
 import os
-import httpx
+from services.http_client import get_http_client
 
 BASE_URL = os.getenv("AUTH_URL")
+# El cliente compartido no limita la lectura (las generaciones del modelo
+# tardan minutos); el login y el registro sí deben fallar pronto.
+AUTH_TIMEOUT = float(os.getenv("AUTH_TIMEOUT", "5"))
 
 async def login_user(email: str, password: str) -> dict:
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{BASE_URL}/auth/log-in",
-            json={"email": email, "password": password}
-        )
-        response.raise_for_status()  # lanza error si status != 200
-        return response.json()
+    client = get_http_client()
+    response = await client.post(
+        f"{BASE_URL}/auth/log-in",
+        json={"email": email, "password": password},
+        timeout=AUTH_TIMEOUT
+    )
+    response.raise_for_status()  # lanza error si status != 200
+    return response.json()
 
 
 async def signup_user(email: str, password: str, name: str) -> dict:
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{BASE_URL}/auth/sign-up",
-            json={"email": email, "password": password, "name": name}
-        )
-        response.raise_for_status()
-        return response.json()
+    client = get_http_client()
+    response = await client.post(
+        f"{BASE_URL}/auth/sign-up",
+        json={"email": email, "password": password, "name": name},
+        timeout=AUTH_TIMEOUT
+    )
+    response.raise_for_status()
+    return response.json()
 
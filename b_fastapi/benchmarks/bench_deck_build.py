@@ -0,0 +1,95 @@
+"""
+Benchmark de la exportación de mazos (write_deck_package) con miles de
+tarjetas, comparada con la versión anterior que creaba el genanki.Model en
+cada mazo y pasaba cada tarjeta por model_dump(). Comprueba además que las
+notas generadas son idénticas.
+
+    cd b_fastapi
+    python benchmarks/bench_deck_build.py [--cards 2000 10000] [--runs 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from schemas.decks_schema import ConfirmDeckRequest  # noqa: E402
+from services.deck_creator import _read_apkg_notes, card_css, write_deck_package  # noqa: E402
+
+TEMPLATE = {"template_name": "Básico", "template_id": 1607392319, "front": ["pregunta", "pista"], "back": ["respuesta"]}
+
+def legacy_write_deck_package(data: ConfirmDeckRequest, deck_id: int) -> str:
+    # la versión anterior de write_deck_package
+    import genanki
+    front_fields = data.template.front
+    back_fields = data.template.back
+
+    qfmt = '<div class="card">\n'
+    for f in front_fields:
+        qfmt += f'  <div class="my-question">{{{{{f}}}}}</div>\n'
+    qfmt += '</div>'
+    afmt = '{{FrontSide}}<hr id="answer">\n'
+    for f in back_fields:
+        afmt += f'  <div class="my-answer">{{{{{f}}}}}</div>\n'
+
+    model = genanki.Model(
+        model_id=data.template.template_id,
+        name=data.template.template_name,
+        fields=[{"name": f} for f in front_fields + back_fields],
+        templates=[{'name': 'Template dinámico', 'qfmt': qfmt, 'afmt': afmt}],
+        css=card_css,
+    )
+    deck = genanki.Deck(deck_id=deck_id, name=data.deckname)
+    for entry in data.flashc:
+        entry_dict = entry.model_dump()
+        front_values = next((v for k, v in entry_dict.items() if isinstance(v, list) and "anverso" in k.lower()), [])
+        back_values = next((v for k, v in entry_dict.items() if isinstance(v, list) and "reverso" in k.lower()), [])
+        padded_front = front_values + [""] * (len(front_fields) - len(front_values))
+        padded_back = back_values + [""] * (len(back_fields) - len(back_values))
+        deck.add_note(genanki.Note(model=model, fields=padded_front[:len(front_fields)] + padded_back[:len(back_fields)]))
+
+    output_path = Path("decks") / f"legacy_{deck_id}.apkg"
+    output_path.parent.mkdir(exist_ok=True)
+    genanki.Package(deck).write_to_file(str(output_path))
+    return str(output_path.resolve())
+
+def make_request(cards: int) -> ConfirmDeckRequest:
+    flashc = [
+        {"campos_anverso": [f"¿Qué es el concepto {i}?", f"pista {i % 7}"], "campo_reverso": [f"Explicación del concepto {i}."]}
+        for i in range(cards)
+    ]
+    return ConfirmDeckRequest(deckname=f"Mazo {cards}", template=TEMPLATE, flashc=flashc)
+
+def median_of(runs: int, fn) -> tuple[float, str]:
+    times, out = [], None
+    for _ in range(runs):
+        started = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), out
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, nargs="+", default=[2000, 10000])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # write_deck_package escribe en ./decks
+    os.chdir(tempfile.mkdtemp(prefix="bench_deck_build_"))
+    for count in args.cards:
+        data = make_request(count)
+        deck_id = 2_000_000_000 + count
+        current, path = median_of(args.runs, lambda: write_deck_package(data, deck_id))
+        legacy, legacy_path = median_of(args.runs, lambda: legacy_write_deck_package(data, deck_id))
+        same = _read_apkg_notes(Path(path), TEMPLATE["template_id"]) == _read_apkg_notes(Path(legacy_path), TEMPLATE["template_id"])
+        print(
+            f"{count:6} tarjetas | actual {current * 1000:7.1f} ms ({count / current:7.0f} tarjetas/s) | "
+            f"anterior {legacy * 1000:7.1f} ms ({count / legacy:7.0f} tarjetas/s) | notas idénticas: {same}"
+        )
+
+if __name__ == "__main__":
+    main()
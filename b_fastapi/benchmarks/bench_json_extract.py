@@ -0,0 +1,97 @@
+"""
+Benchmark de la extracción de tarjetas (services/json_extract.py) sobre
+respuestas del modelo grandes y desordenadas: texto alrededor del JSON,
+corchetes dentro de los valores, objetos mal formados y arreglos truncados.
+Compara con la extracción anterior por expresión regular.
+
+    cd b_fastapi
+    python benchmarks/bench_json_extract.py [--cards 2000] [--runs 5]
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from services.json_extract import IncrementalCardParser, extract_card_objects  # noqa: E402
+
+_WORDS = "célula membrana energía ATP enzima proteína glucosa núcleo ribosoma mitocondria".split()
+
+def legacy_extract(text: str) -> list:
+    # la versión anterior de extract_valid_json
+    for match in re.findall(r'\[\s*{[\s\S]*?}\s*]', text):
+        try:
+            return json.loads(match)
+        except json.JSONDecodeError:
+            continue
+    return []
+
+def make_card(rng: random.Random, brackets: bool) -> dict:
+    front = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(3, 12))) + "?"
+    back = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(10, 60)))
+    if brackets:
+        back += ' [ver {"tabla": [1, 2]}] y la lista ["a", "b"] '
+    return {"campos_anverso": {"pregunta": front}, "campo_reverso": {"respuesta": back}}
+
+def make_outputs(cards: int, seed: int = 8) -> dict[str, str]:
+    rng = random.Random(seed)
+    plain = [make_card(rng, False) for _ in range(cards)]
+    nested = [make_card(rng, True) for _ in range(cards)]
+    array = json.dumps(plain, ensure_ascii=False)
+
+    # objetos sueltos con una coma de más cada 50 tarjetas
+    parts = [json.dumps(card, ensure_ascii=False) for card in plain]
+    for i in range(0, len(parts), 50):
+        parts[i] = parts[i][:-1] + ",}"
+    malformed = "[" + ", ".join(parts) + "]"
+
+    chatter = "Claro, aquí tienes [las tarjetas] que pediste (ver [1], [2]).\n" * 200
+    return {
+        "limpio": array,
+        "con texto y ```json": chatter + "```json\n" + array + "\n```\n¿Algo más? [fin]",
+        "corchetes en valores": json.dumps(nested, ensure_ascii=False),
+        "objetos mal formados": malformed,
+        "truncado": array[: int(len(array) * 0.9)],
+        "muchos '[' sin tarjetas": "[x] " * 50_000 + array,
+    }
+
+def best_of(runs: int, fn) -> tuple[float, list]:
+    best, out = float("inf"), None
+    for _ in range(runs):
+        started = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, out
+
+def feed_in_pieces(text: str, piece: int = 64) -> list:
+    # como llega por streaming: fragmentos pequeños
+    parser = IncrementalCardParser()
+    for i in range(0, len(text), piece):
+        parser.feed(text[i:i + piece])
+        if parser.closed:
+            break
+    return parser.cards
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cards", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, text in make_outputs(args.cards).items():
+        elapsed, cards = best_of(args.runs, lambda: extract_card_objects(text))
+        stream_elapsed, stream_cards = best_of(args.runs, lambda: feed_in_pieces(text))
+        legacy_elapsed, legacy_cards = best_of(args.runs, lambda: legacy_extract(text))
+        print(
+            f"{name:24} {len(text) / 1e6:5.2f} MB | "
+            f"actual {elapsed * 1000:7.1f} ms ({len(cards)} tarjetas) | "
+            f"streaming {stream_elapsed * 1000:7.1f} ms ({len(stream_cards)}) | "
+            f"regex {legacy_elapsed * 1000:7.1f} ms ({len(legacy_cards)})"
+        )
+
+if __name__ == "__main__":
+    main()
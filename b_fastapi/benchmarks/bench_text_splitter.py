@@ -0,0 +1,74 @@
+"""
+Benchmark del splitter propio sobre textos de varios MB. Si langchain está
+instalado, compara tiempos y comprueba que la salida es idéntica.
+
+    cd b_fastapi
+    python benchmarks/bench_text_splitter.py [--mb 4] [--runs 3]
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+
+from services.chunking import estimate_tokens  # noqa: E402
+from services.text_splitter import DEFAULT_SEPARATORS, RecursiveTextSplitter  # noqa: E402
+
+_WORDS = (
+    "la fotosíntesis energía luminosa clorofila ciclo de Calvin carbono ATP NADPH membrana "
+    "tilacoide estroma fotosistema electrones oxígeno glucosa planta hoja célula"
+).split()
+
+def make_text(megabytes: float, seed: int = 8) -> str:
+    # prosa con frases, saltos de línea, párrafos y alguna "palabra" muy larga (URLs, fórmulas)
+    rng = random.Random(seed)
+    target = int(megabytes * 1_000_000)
+    parts, size = [], 0
+    while size < target:
+        sentence = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(4, 25)))
+        if rng.random() < 0.02:
+            sentence += " " + "x" * rng.randint(200, 1200)
+        sentence += rng.choice([".", ".", ".", ",", "!", "?"]) + rng.choice([" ", " ", "\n", "\n\n"])
+        parts.append(sentence)
+        size += len(sentence)
+    return "".join(parts)
+
+def best_of(runs: int, fn) -> tuple[float, list]:
+    best, out = float("inf"), None
+    for _ in range(runs):
+        started = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, out
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=float, default=4.0)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    text = make_text(args.mb)
+    configs = [("chars 800/150", 800, 150, len), ("tokens 1500/150", 1500, 150, estimate_tokens)]
+    try:
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+    except ImportError:
+        RecursiveCharacterTextSplitter = None
+        print("langchain no está instalado: solo se mide el splitter propio")
+
+    print(f"texto: {len(text) / 1e6:.1f} MB")
+    for name, size, overlap, length_function in configs:
+        native = RecursiveTextSplitter(size, overlap, length_function)
+        elapsed, chunks = best_of(args.runs, lambda: native.split_text(text))
+        line = f"{name:16} propio {elapsed:6.2f} s ({len(text) / 1e6 / elapsed:5.1f} MB/s, {len(chunks)} chunks)"
+        if RecursiveCharacterTextSplitter is not None:
+            reference = RecursiveCharacterTextSplitter(
+                chunk_size=size, chunk_overlap=overlap, length_function=length_function, separators=DEFAULT_SEPARATORS
+            )
+            ref_elapsed, ref_chunks = best_of(args.runs, lambda: reference.split_text(text))
+            line += f" | langchain {ref_elapsed:6.2f} s | idéntico: {ref_chunks == chunks}"
+        print(line)
+
+if __name__ == "__main__":
+    main()
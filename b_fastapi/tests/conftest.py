@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+# el código del servicio se importa como en el contenedor (WORKDIR /app)
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+sys.path.insert(0, str(APP_DIR))
@@ -0,0 +1,68 @@
+"""
+Regenera splitter_golden.json con la salida de RecursiveCharacterTextSplitter
+de langchain, la referencia de `services.text_splitter`. Necesita langchain
+instalado (ya no está en requirements.txt):
+
+    pip install "langchain==0.2.17"
+    python tests/fixtures/capture_splitter_golden.py
+"""
+import json
+import random
+from pathlib import Path
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+SEPARATORS = ["\n\n", "\n", ".", "!", "?", ",", " "]
+CHARS_PER_TOKEN = 3.5
+OUTPUT = Path(__file__).with_name("splitter_golden.json")
+
+# texto aleatorio con todos los separadores, espacios dobles y palabras
+# más largas que el chunk (obligan a bajar hasta el último separador)
+_ALPHABET = list("abcdefghij") * 5 + [" "] * 12 + ["\n"] * 2 + [
+    "\n\n", ".", "!", "?", ",", "  ", ". ", "\n \n", "x" * 38,
+]
+_SENTENCES = [
+    "La fotosíntesis convierte la energía luminosa en energía química.",
+    "¿Qué papel cumple la clorofila en los fotosistemas?",
+    "El ciclo de Calvin fija el carbono atmosférico, usando ATP y NADPH.",
+    "Sin luz, la fase luminosa se detiene por completo!",
+    "Las mitocondrias, en cambio, liberan la energía almacenada.",
+]
+
+def _random_text(rng: random.Random) -> str:
+    return "".join(rng.choice(_ALPHABET) for _ in range(rng.randint(0, 800)))
+
+def _prose(rng: random.Random) -> str:
+    paragraphs = []
+    for _ in range(rng.randint(1, 8)):
+        lines = [" ".join(rng.choice(_SENTENCES) for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 3))]
+        paragraphs.append("\n".join(lines))
+    return "\n\n".join(paragraphs)
+
+def main():
+    rng = random.Random(17)
+    cases = []
+    for n in range(200):
+        text = _prose(rng) if n % 3 == 0 else _random_text(rng)
+        chunk_size = rng.choice([5, 20, 50, 120, 400, 800])
+        chunk_overlap = rng.randint(0, min(chunk_size, 200))
+        length = "tokens" if chunk_size >= 20 and n % 4 == 1 else "chars"
+        length_function = (lambda t: int(len(t) / CHARS_PER_TOKEN) + 1) if length == "tokens" else len
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=length_function,
+            separators=SEPARATORS,
+        )
+        cases.append({
+            "text": text,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "length": length,
+            "expected": splitter.split_text(text),
+        })
+    OUTPUT.write_text(json.dumps({"chars_per_token": CHARS_PER_TOKEN, "cases": cases}, ensure_ascii=False), encoding="utf-8")
+    print(f"{len(cases)} casos -> {OUTPUT}")
+
+if __name__ == "__main__":
+    main()
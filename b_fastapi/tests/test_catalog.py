@@ -0,0 +1,60 @@
+import json
+import os
+
+import pytest
+
+from schemas.template_schema import TemplateResponse
+from services import catalog
+
+@pytest.fixture
+def templates_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "templates"
+    monkeypatch.setattr(catalog, "CATALOG_DIR", tmp_path / "cache")
+    monkeypatch.setattr(catalog, "_conn", None)
+    monkeypatch.setitem(catalog._SOURCES, "template", (directory, TemplateResponse, "template_id", "template_name"))
+    yield directory
+    if catalog._conn is not None:
+        catalog._conn.close()
+        catalog._conn = None
+
+def write_template(directory, template_id, name, mtime_ns=None):
+    path = directory / f"{template_id}.json"
+    path.write_text(json.dumps({"template_id": template_id, "template_name": name, "front": ["a"], "back": ["b"]}))
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return path
+
+def names(kind="template"):
+    items, _ = catalog.query_items(kind, sort="id", descending=False)
+    return [item["template_name"] for item in items]
+
+def test_new_and_deleted_files_are_picked_up(templates_dir):
+    templates_dir.mkdir()
+    write_template(templates_dir, 1, "uno")
+    assert names() == ["uno"]
+
+    path = write_template(templates_dir, 2, "dos")
+    assert names() == ["uno", "dos"]
+
+    path.unlink()
+    assert names() == ["uno"]
+
+def test_file_edited_in_place_is_reread(templates_dir):
+    templates_dir.mkdir()
+    write_template(templates_dir, 1, "uno", mtime_ns=1_000_000_000)
+    assert names() == ["uno"]
+
+    # reescribir un archivo existente no cambia el mtime del directorio
+    dir_mtime = templates_dir.stat().st_mtime_ns
+    write_template(templates_dir, 1, "renombrado", mtime_ns=2_000_000_000)
+    os.utime(templates_dir, ns=(dir_mtime, dir_mtime))
+    assert names() == ["renombrado"]
+    assert catalog.get_item("template", 1)["template_name"] == "renombrado"
+
+def test_invalid_files_are_skipped(templates_dir):
+    templates_dir.mkdir()
+    write_template(templates_dir, 1, "uno")
+    (templates_dir / "roto.json").write_text("{no es json")
+    items, total = catalog.query_items("template")
+    assert total == 1 and items[0]["template_id"] == 1
+    assert catalog.item_ids("template") == {1}
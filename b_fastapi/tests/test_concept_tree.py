@@ -0,0 +1,42 @@
+from services.concept_tree import parse_blueprint, select_concepts
+
+OUTLINE = """
+# Fotosíntesis
+## Fase luminosa
+- Fotosistema II
+  - Fotólisis del agua
+  - Liberación de oxígeno
+- Cadena de transporte de electrones
+## Ciclo de Calvin
+- Fijación del carbono
+  - RuBisCO
+"""
+
+def texts(concepts):
+    return [text for text, _ in concepts]
+
+def test_default_depth_folds_deeper_nodes():
+    concepts = texts(select_concepts(parse_blueprint(OUTLINE)))
+    assert concepts == [
+        "Fase luminosa",
+        "Fotosistema II: incluye Fotólisis del agua; Liberación de oxígeno",
+        "Cadena de transporte de electrones",
+        "Ciclo de Calvin",
+        "Fijación del carbono: incluye RuBisCO",
+    ]
+
+def test_top_level_only():
+    concepts = texts(select_concepts(parse_blueprint(OUTLINE), max_depth=1))
+    assert concepts == [
+        "Fase luminosa: incluye Fotosistema II (Fotólisis del agua; Liberación de oxígeno); "
+        "Cadena de transporte de electrones",
+        "Ciclo de Calvin: incluye Fijación del carbono (RuBisCO)",
+    ]
+
+def test_unbounded_depth_selects_every_node():
+    assert len(select_concepts(parse_blueprint(OUTLINE), max_depth=None)) == 8
+
+def test_budget_prefers_higher_levels():
+    concepts = select_concepts(parse_blueprint(OUTLINE), max_concepts=3)
+    assert texts(concepts)[0].startswith("Fase luminosa: incluye Cadena")
+    assert [priority for _, priority in concepts] == [0, 2, 1]
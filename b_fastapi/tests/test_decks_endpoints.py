@@ -0,0 +1,66 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.v1.endpoints import decks
+from services import document_cache
+from services.chunking import parse_page_selection
+
+REQUEST = {
+    "template": {"template_name": "t", "template_id": 1, "front": ["pregunta"], "back": ["respuesta"]},
+    "prompt": {"system_prompt": "p", "temperature": 0.5, "max_tokens": 256},
+}
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_cache, "DOCUMENT_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(document_cache, "_conn", None)
+    app = FastAPI()
+    app.include_router(decks.router, prefix="/decks")
+    yield TestClient(app)
+    if document_cache._conn is not None:
+        document_cache._conn.close()
+        document_cache._conn = None
+
+def post_create(client, path, request, upload=True):
+    files = {"pdf_file": ("doc.pdf", b"%PDF-1.4 prueba", "application/pdf")} if upload else None
+    return client.post(path, data={"Create_Deck_Request": json.dumps(request)}, files=files)
+
+@pytest.mark.parametrize("path", ["/decks/create/", "/decks/create/stream/", "/decks/jobs/create/"])
+def test_missing_pdf_and_document_id_is_bad_request(client, path):
+    response = post_create(client, path, REQUEST, upload=False)
+    assert response.status_code == 400
+
+def test_unknown_document_id_is_not_found(client):
+    response = post_create(client, "/decks/create/", {**REQUEST, "document_id": "0" * 64}, upload=False)
+    assert response.status_code == 404
+
+def test_invalid_page_selection_is_bad_request(client, monkeypatch):
+    async def fake_process(pdf_path, pages=None, **kwargs):
+        parse_page_selection(pages, 3)
+        return []
+
+    monkeypatch.setattr(decks, "process_deck_creation", fake_process)
+    for pages in ("abc", "5-2", "10-"):
+        response = post_create(client, "/decks/create/", {**REQUEST, "pages": pages})
+        assert response.status_code == 400, pages
+
+def test_unexpected_error_is_server_error(client, monkeypatch):
+    async def fake_process(pdf_path, **kwargs):
+        raise RuntimeError("LM Studio caído")
+
+    monkeypatch.setattr(decks, "process_deck_creation", fake_process)
+    response = post_create(client, "/decks/create/", REQUEST)
+    assert response.status_code == 500
+
+def test_skip_report_is_returned_in_a_header(client, monkeypatch):
+    async def fake_process(pdf_path, report=None, **kwargs):
+        report.update({"chunks_total": 5, "chunks_skipped_low_info": 2})
+        return []
+
+    monkeypatch.setattr(decks, "process_deck_creation", fake_process)
+    response = post_create(client, "/decks/create/", REQUEST)
+    assert response.status_code == 200
+    assert json.loads(response.headers["X-Skip-Report"]) == {"chunks_total": 5, "chunks_skipped_low_info": 2}
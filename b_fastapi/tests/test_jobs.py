@@ -0,0 +1,98 @@
+import asyncio
+import io
+import sqlite3
+
+import pytest
+from fastapi import UploadFile
+
+from schemas.decks_schema import CreateDeckRequest
+from services import document_cache, jobs_service
+
+REQUEST = {
+    "template": {"template_name": "t", "template_id": 1, "front": ["pregunta"], "back": ["respuesta"]},
+    "prompt": {"system_prompt": "p", "temperature": 0.5, "max_tokens": 256},
+}
+
+@pytest.fixture
+def jobs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs_service, "JOBS_DIR", tmp_path / "jobs")
+    monkeypatch.setattr(jobs_service, "_conn", None)
+    monkeypatch.setattr(jobs_service, "JOB_WORKERS", 1)
+    monkeypatch.setattr(document_cache, "DOCUMENT_CACHE_ENABLED", False)
+    monkeypatch.setattr(document_cache, "DOCUMENT_CACHE_DIR", tmp_path / "cache")
+    yield tmp_path / "jobs"
+    if jobs_service._conn is not None:
+        jobs_service._conn.close()
+        jobs_service._conn = None
+
+def upload():
+    return UploadFile(io.BytesIO(b"%PDF-1.4 prueba"), filename="doc.pdf")
+
+def test_cancelled_job_keeps_its_pdf(jobs_dir, monkeypatch):
+    started = asyncio.Event()
+
+    async def hanging_process(pdf_path, **kwargs):
+        started.set()
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(jobs_service, "process_deck_creation", hanging_process)
+
+    async def scenario():
+        jobs_service.start_job_workers()
+        job_id, document_id = await jobs_service.submit_pdf_job(CreateDeckRequest(**REQUEST), upload())
+        await asyncio.wait_for(started.wait(), 5)
+        await jobs_service.stop_job_workers()
+        return job_id, document_id
+
+    job_id, document_id = asyncio.run(scenario())
+    assert document_id is None
+    assert jobs_service.get_job(job_id)["status"] == "running"
+    # el job se reencolará al arrancar y necesita su copia del PDF
+    assert jobs_service._pdf_path(job_id).exists()
+
+def test_finished_job_removes_its_pdf(jobs_dir, monkeypatch):
+    async def failing_process(pdf_path, **kwargs):
+        raise RuntimeError("LM Studio caído")
+
+    monkeypatch.setattr(jobs_service, "process_deck_creation", failing_process)
+
+    async def scenario():
+        job_id, _ = await jobs_service.submit_pdf_job(CreateDeckRequest(**REQUEST), upload())
+        await jobs_service._run_job(job_id)
+        return job_id
+
+    job_id = asyncio.run(scenario())
+    assert jobs_service.get_job(job_id)["status"] == "failed"
+    assert not jobs_service._pdf_path(job_id).exists()
+
+def test_job_status_includes_the_skip_report(jobs_dir, monkeypatch):
+    async def fake_process(pdf_path, report=None, **kwargs):
+        report.update({"repeated_lines_removed": 3, "chunks_total": 4})
+        return []
+
+    monkeypatch.setattr(jobs_service, "process_deck_creation", fake_process)
+
+    async def scenario():
+        job_id, _ = await jobs_service.submit_pdf_job(CreateDeckRequest(**REQUEST), upload())
+        await jobs_service._run_job(job_id)
+        return job_id
+
+    job = jobs_service.get_job(asyncio.run(scenario()))
+    assert job["status"] == "completed"
+    assert job["skipped"] == {"repeated_lines_removed": 3, "chunks_total": 4}
+
+def test_old_jobs_table_gains_the_skipped_column(jobs_dir):
+    jobs_dir.mkdir(parents=True)
+    conn = sqlite3.connect(jobs_dir / "jobs.sqlite")
+    conn.execute("""
+        CREATE TABLE jobs (
+            job_id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, request TEXT NOT NULL,
+            progress_done INTEGER NOT NULL DEFAULT 0, progress_total INTEGER NOT NULL DEFAULT 0,
+            failed_chunks INTEGER NOT NULL DEFAULT 0, error TEXT, result TEXT,
+            created_at REAL NOT NULL, updated_at REAL NOT NULL
+        )
+    """)
+    conn.execute("INSERT INTO jobs (job_id, kind, status, request, created_at, updated_at) VALUES ('j', 'pdf', 'completed', '{}', 0, 0)")
+    conn.commit()
+    conn.close()
+    assert jobs_service.get_job("j")["skipped"] is None
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from services.json_extract import IncrementalCardParser, extract_card_objects
+
+CARDS = [
+    {"campos_anverso": {"pregunta": "¿Qué es el ATP?"}, "campo_reverso": {"respuesta": "Energía [ver {tabla}]"}},
+    {"campos_anverso": {"pregunta": "x"}, "campo_reverso": {"respuesta": "}, {no es un objeto"}},
+    {"campos_anverso": {"pregunta": "y", "lista": [{"a": 1}]}, "campo_reverso": {"respuesta": "z"}},
+]
+ARRAY = json.dumps(CARDS, ensure_ascii=False)
+
+def streamed(text: str, piece: int = 7) -> list[dict]:
+    parser = IncrementalCardParser()
+    for i in range(0, len(text), piece):
+        parser.feed(text[i:i + piece])
+    return parser.cards
+
+@pytest.mark.parametrize("text", [
+    ARRAY,
+    "Claro, aquí [tienes] las tarjetas:\n```json\n" + ARRAY + "\n```\n[fin]",
+    "[x] " * 1000 + ARRAY,
+    "[]" + ARRAY,
+    json.dumps(CARDS, indent=2, ensure_ascii=False),
+])
+def test_recovers_every_card(text):
+    assert extract_card_objects(text) == CARDS
+    assert streamed(text) == CARDS
+
+def test_malformed_objects_are_dropped():
+    parts = [json.dumps(card, ensure_ascii=False) for card in CARDS]
+    parts[1] = parts[1][:-1] + ",}"
+    text = "[" + ", ".join(parts) + "]"
+    assert extract_card_objects(text) == [CARDS[0], CARDS[2]]
+    assert streamed(text) == [CARDS[0], CARDS[2]]
+
+def test_truncated_array_keeps_complete_cards():
+    text = ARRAY[:ARRAY.rindex("{") + 10]
+    assert extract_card_objects(text) == CARDS[:2]
+    assert streamed(text) == CARDS[:2]
+
+def test_only_the_first_array_with_cards():
+    text = '[{"a": 1}] y luego [{"b": 2}]'
+    assert extract_card_objects(text) == [{"a": 1}]
+
+@pytest.mark.parametrize("text", ["", "sin json", "[1, 2, 3]", "[]", '[{"a": 1,}]', '[{"a": '])
+def test_no_cards(text):
+    assert extract_card_objects(text) == []
@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from schemas.llm_schema import LLMRequest
+from services import llm_backends, llm_service
+from services.llm_backends import BackendPool
+
+FAST, SLOW = "http://fast:1234", "http://slow:1234"
+
+def expire(backend):
+    backend.ejected_until = 1.0  # la expulsión ya venció
+
+def slow_ejected_pool() -> BackendPool:
+    pool = BackendPool([FAST, SLOW], [4])
+    fast, slow = pool.backends
+    pool.report_success(fast, 1.0)
+    pool.report_success(slow, 10.0)
+    assert not slow.healthy and slow.failures == 0
+    return pool
+
+def test_slow_backend_starts_fresh_after_ejection():
+    pool = slow_ejected_pool()
+    slow = pool.backends[1]
+    expire(slow)
+    pool.report_success(slow, 1.5)
+    assert slow.healthy and not slow.ejected
+    assert slow.latency_ewma == 1.5
+
+def test_health_check_probes_slow_ejected_backend(monkeypatch):
+    pool = slow_ejected_pool()
+    slow = pool.backends[1]
+    expire(slow)
+    probed = []
+
+    async def handler(request):
+        probed.append(str(request.url))
+        return httpx.Response(200, json={"data": []})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(llm_backends, "get_http_client", lambda: client)
+    asyncio.run(pool.check_health())
+    assert probed == [f"{SLOW}/v1/models"]
+    assert slow.healthy and not slow.ejected and slow.latency_ewma is None
+
+def sse(*deltas: str) -> bytes:
+    events = [f"data: {json.dumps({'choices': [{'delta': {'content': d}}]})}\n\n" for d in deltas]
+    return ("".join(events) + "data: [DONE]\n\n").encode()
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = BackendPool([FAST, SLOW], [4])
+    monkeypatch.setattr(llm_service, "backend_pool", pool)
+    return pool
+
+def use_transport(monkeypatch, handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(llm_service, "get_http_client", lambda: client)
+
+REQUEST = LLMRequest(messages=[{"role": "user", "content": "hola"}], use_cache=False)
+
+def test_stream_retries_on_another_backend_after_connection_error(pool, monkeypatch):
+    async def handler(request):
+        if request.url.host == "fast":
+            raise httpx.ConnectError("rechazada", request=request)
+        return httpx.Response(200, content=sse("[{", "}]"))
+
+    use_transport(monkeypatch, handler)
+    response = asyncio.run(llm_service.query_llm_stream(REQUEST))
+    assert response.response == "[{}]"
+    assert [b.failures for b in pool.backends] == [1, 0]
+
+def test_stream_reports_server_errors(pool, monkeypatch):
+    async def handler(request):
+        return httpx.Response(503, text="sobrecargado")
+
+    use_transport(monkeypatch, handler)
+    with pytest.raises(Exception, match="LM Studio error"):
+        asyncio.run(llm_service.query_llm_stream(REQUEST))
+    assert sum(b.failures for b in pool.backends) == 1
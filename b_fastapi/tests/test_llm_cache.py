@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+import pytest
+
+from schemas.llm_schema import LLMRequest
+from services import llm_cache, llm_service
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_MAX_BYTES", 100)
+    monkeypatch.setattr(llm_cache, "_conn", None)
+    yield llm_cache
+    if llm_cache._conn is not None:
+        llm_cache._conn.close()
+        llm_cache._conn = None
+
+def stored_size(cache) -> int:
+    return cache._get_conn().execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+def test_running_size_matches_stored_rows(cache):
+    cache.store_response("a", "x" * 30)
+    cache.store_response("b", "y" * 30)
+    cache.store_response("a", "z" * 10)  # reemplazo
+    assert cache._size == stored_size(cache) == 40
+
+    cache.drop_response("b")
+    cache.drop_response("desconocida")
+    assert cache._size == stored_size(cache) == 10
+
+    for key in "cdefg":
+        cache.store_response(key, "w" * 30)  # supera el límite: expulsa las más antiguas
+    assert cache._size == stored_size(cache) <= 100
+    assert cache.cache_stats()["size_bytes"] == cache._size
+
+    cache.clear_cache()
+    assert cache._size == stored_size(cache) == 0
+
+def test_running_size_is_loaded_from_disk(cache):
+    cache.store_response("a", "x" * 25)
+    cache._conn.close()
+    cache._conn = None
+    cache._size = 0
+    cache._get_conn()
+    assert cache._size == 25
+
+def test_cache_lookups_run_off_the_event_loop(cache, monkeypatch):
+    threads = []
+
+    def lookup(key):
+        threads.append(threading.get_ident())
+        return "respuesta guardada"
+
+    async def model_id():
+        return "modelo"
+
+    monkeypatch.setattr(llm_cache, "get_cached_response", lookup)
+    monkeypatch.setattr(llm_service, "get_loaded_model_id", model_id)
+    request = LLMRequest(messages=[{"role": "user", "content": "hola"}])
+    response = asyncio.run(llm_service.query_llm(request))
+    assert response.response == "respuesta guardada"
+    assert threads and threads[0] != threading.get_ident()
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent / "app"
+
+# Presupuesto del arranque en frío: tiempo de `import main` en un proceso
+# nuevo (el mejor de varios intentos, para no depender del ruido de la máquina).
+STARTUP_IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "1000"))
+STARTUP_IMPORT_RUNS = int(os.getenv("STARTUP_IMPORT_RUNS", "3"))
+
+# dependencias pesadas que solo deben cargarse al usarse
+LAZY_MODULES = ("fitz", "pymupdf", "genanki", "appwrite", "dotenv", "langchain")
+
+_PROBE = f"""
+import sys, time
+started = time.perf_counter()
+import main
+elapsed = (time.perf_counter() - started) * 1000
+loaded = [m for m in {LAZY_MODULES!r} if m in sys.modules]
+print(f"{{elapsed:.1f}} {{','.join(loaded)}}")
+"""
+
+def _cold_import() -> tuple[float, list[str]]:
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=APP_DIR, capture_output=True, text=True, check=True
+    )
+    elapsed, _, loaded = result.stdout.strip().splitlines()[-1].partition(" ")
+    return float(elapsed), [m for m in loaded.split(",") if m]
+
+def test_import_main_does_not_load_heavy_dependencies():
+    _, loaded = _cold_import()
+    assert loaded == [], f"import main carga {loaded}; deben importarse al usarse"
+
+def test_import_main_within_budget():
+    best = min(_cold_import()[0] for _ in range(STARTUP_IMPORT_RUNS))
+    print(f"import main: {best:.0f} ms (presupuesto {STARTUP_IMPORT_BUDGET_MS:.0f} ms)")
+    assert best <= STARTUP_IMPORT_BUDGET_MS, (
+        f"import main tarda {best:.0f} ms, por encima del presupuesto de {STARTUP_IMPORT_BUDGET_MS:.0f} ms"
+    )
@@ -0,0 +1,32 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from services.chunking import chunk_text
+from services.text_splitter import RecursiveTextSplitter
+
+# Salida de langchain (RecursiveCharacterTextSplitter) capturada con
+# fixtures/capture_splitter_golden.py: el splitter propio debe coincidir.
+GOLDEN = json.loads(Path(__file__).with_name("fixtures").joinpath("splitter_golden.json").read_text(encoding="utf-8"))
+CHARS_PER_TOKEN = GOLDEN["chars_per_token"]
+
+def _tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+@pytest.mark.parametrize("case", GOLDEN["cases"], ids=lambda c: f"{c['length']}-{c['chunk_size']}-{c['chunk_overlap']}")
+def test_matches_langchain_output(case):
+    splitter = RecursiveTextSplitter(
+        case["chunk_size"],
+        case["chunk_overlap"],
+        length_function=_tokens if case["length"] == "tokens" else len,
+    )
+    assert splitter.split_text(case["text"]) == case["expected"]
+
+def test_chunk_text_defaults_match_splitter():
+    text = "\n\n".join(case["text"] for case in GOLDEN["cases"][:40])
+    assert chunk_text(text) == RecursiveTextSplitter(800, 150).split_text(text)
+
+def test_overlap_larger_than_chunk_is_rejected():
+    with pytest.raises(ValueError):
+        RecursiveTextSplitter(10, 20)
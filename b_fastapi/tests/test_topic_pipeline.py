@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+import pytest
+
+from schemas.decks_schema import TopicDeckRequest
+from schemas.llm_schema import LLMResponse
+from services import decks_service
+
+OUTLINE = "\n".join(f"{n}. Concepto {n}" for n in range(1, 9))
+
+class FakeModel:
+    """Sustituye a query_llm y cuenta las peticiones simultáneas."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+
+    async def __call__(self, request):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            content = request.messages[-1].content
+            if "esquema maestro" in content:
+                return LLMResponse(response=OUTLINE)
+            if "desarrollar de forma detallada" in content:
+                return LLMResponse(response="Explicación del concepto.")
+            # el formato que espera sanitize_flashcards: anverso y reverso por separado
+            card = [{"campos_anverso": ["¿Pregunta?"]}, {"campo_reverso": [f"Respuesta {self.calls}"]}]
+            return LLMResponse(response=json.dumps(card))
+        finally:
+            self.in_flight -= 1
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = FakeModel()
+    monkeypatch.setattr(decks_service, "query_llm", fake)
+    monkeypatch.setattr(decks_service, "CHECKPOINTS_ENABLED", False)
+    return fake
+
+def topic_request(concurrency):
+    return TopicDeckRequest(
+        topic="Fotosíntesis",
+        prompt={"system_prompt": "p", "use_cache": False},
+        template={"template_name": "t", "template_id": 1, "front": ["pregunta"], "back": ["respuesta"]},
+        concurrency=concurrency,
+        dedup=False,
+    )
+
+@pytest.mark.parametrize("concurrency", [1, 2, 4])
+def test_expansion_and_cards_share_the_concurrency_limit(model, concurrency):
+    cards = asyncio.run(asyncio.wait_for(decks_service.create_topic_flashcards(topic_request(concurrency)), 10))
+    assert len(cards) == 8
+    assert model.calls == 1 + 2 * 8
+    assert model.peak == concurrency